@@ -5,6 +5,8 @@ from utils.map_helper import (
     find_nearby_facilities_by_coords,
     show_facilities_map, 
     parse_facilities_to_df,
+    filter_by_radius,
+    format_facilities_markdown,
     reverse_geocode,
     get_navigation_url,
     create_interactive_map
@@ -16,7 +18,8 @@ from utils.ai_helpers import (
     assess_emergency_level,
     get_medical_disclaimer,
     analyze_existing_record,
-    chat_about_record
+    chat_about_record,
+    warmup
 )
 from utils.health_records import (
     init_health_records,
@@ -45,7 +48,10 @@ from utils.voice_assistant import (
     announce_statistics,
     process_voice_command,
     speak_welcome_message,
-    speak_help_message
+    speak_help_message,
+    prewarm_voices,
+    flush_speech_queue,
+    reset_announcement_cache
 )
 from streamlit_js_eval import streamlit_js_eval
 
@@ -54,8 +60,10 @@ def display_hospital_with_navigation(row, idx):
     """Display a hospital entry with navigation button to open map app"""
     col1, col2 = st.columns([3, 1])
     
+    has_coords = "lat" in row and "lon" in row and pd.notna(row['lat']) and pd.notna(row['lon'])
+    
     with col1:
-        if "lat" in row and "lon" in row:
+        if has_coords:
             st.markdown(f"**{idx + 1}. {row['name']}**")
             st.markdown(f"📍 {row['address']}")
             st.caption(f"Coordinates: ({row['lat']:.4f}, {row['lon']:.4f})")
@@ -64,7 +72,7 @@ def display_hospital_with_navigation(row, idx):
             st.markdown(f"📍 {row['address']}")
     
     with col2:
-        if "lat" in row and "lon" in row:
+        if has_coords:
             nav_url = get_navigation_url(row['lat'], row['lon'], row['name'])
             # Open navigation URL in device's map app (Google Maps, Apple Maps, etc.)
             st.link_button("🗺️ Navigate", nav_url, use_container_width=True)
@@ -72,6 +80,9 @@ def display_hospital_with_navigation(row, idx):
 
 st.set_page_config(page_title="AidNexus - AI First Aid Assistant", layout="wide", page_icon="🩹")
 
+# Warm up the Gemini connection in the background (runs once per server process)
+warmup()
+
 # AidNexus Header with Logo
 st.markdown("""
     <div style="text-align: center; padding: 1rem 0; margin-bottom: 2rem;">
@@ -133,7 +144,8 @@ with st.sidebar:
             help="Uses the best available neural voices for natural speech (like Siri/Gemini)"
         )
         
-        # Welcome message on first enable
+        # Pick the browser voice once, then the welcome message on first enable
+        prewarm_voices()
         if 'voice_welcome_shown' not in st.session_state:
             speak_welcome_message()
             st.session_state.voice_welcome_shown = True
@@ -188,6 +200,10 @@ if st.session_state.get('listen_command', False) and st.session_state.voice_assi
                 elif action == "read_first_aid_steps":
                     if st.session_state.get('last_spoken'):
                         announce_first_aid_steps(st.session_state.last_spoken)
+                elif action == "repeat_last":
+                    # Re-announce the current page below
+                    reset_announcement_cache()
+                    st.session_state.current_page = None
                 elif action == "show_voice_help":
                     speak_help_message()
                 elif action == "stop_speaking":
@@ -751,10 +767,10 @@ elif page == "Find Nearby Hospitals":
                     with st.spinner("🔍 Searching nearby hospitals..."):
                         results_text = find_nearby_facilities_by_coords(lat, lon)
                         st.markdown("### 🏥 Nearby Hospitals")
-                        st.markdown(results_text)
+                        st.markdown(format_facilities_markdown(results_text))
                         
                         # Parse results and show map
-                        facilities_df = parse_facilities_to_df(results_text)
+                        facilities_df = filter_by_radius(parse_facilities_to_df(results_text, (lat, lon)), lat, lon)
                         
                         if not facilities_df.empty:
                             # Add user location to map
@@ -807,10 +823,10 @@ elif page == "Find Nearby Hospitals":
             with st.spinner("🔍 Searching nearby hospitals..."):
                 results_text = find_nearby_facilities_by_coords(lat, lon)
                 st.markdown("### 🏥 Nearby Hospitals")
-                st.markdown(results_text)
+                st.markdown(format_facilities_markdown(results_text))
                 
                 # Parse results and show map
-                facilities_df = parse_facilities_to_df(results_text)
+                facilities_df = filter_by_radius(parse_facilities_to_df(results_text, (lat, lon)), lat, lon)
                 
                 if not facilities_df.empty:
                     # Add user location to map
@@ -847,7 +863,7 @@ elif page == "Find Nearby Hospitals":
             with st.spinner("🔍 Searching nearby hospitals..."):
                 results_text = find_nearby_facilities(location_query)
                 st.markdown("### 🏥 Nearby Hospitals")
-                st.markdown(results_text)
+                st.markdown(format_facilities_markdown(results_text))
                 
                 # Parse results and show map
                 facilities_df = parse_facilities_to_df(results_text)
@@ -1195,3 +1211,6 @@ st.markdown("""
         </p>
     </div>
 """, unsafe_allow_html=True)
+
+# Speak everything announced during this run in one go
+flush_speech_queue()
@@ -1,7 +1,17 @@
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime
 import streamlit as st
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from PIL import Image
 from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Configure Gemini API
 genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
@@ -12,25 +22,240 @@ VISION_MODEL = "gemini-2.5-flash"
 TEXT_MODEL = "gemini-2.5-flash"
 
 # Safety settings - Block unsafe content but allow medical discussions
+# Built once as SDK objects so each GenerativeModel skips the dict conversion.
+HarmCategory = genai.types.HarmCategory
+HarmBlockThreshold = genai.types.HarmBlockThreshold
+
 SAFETY_SETTINGS = [
-    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},  # Allow medical content
+    genai.protos.SafetySetting(category=category, threshold=threshold)
+    for category, threshold in (
+        (HarmCategory.HARM_CATEGORY_HARASSMENT, HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE),
+        (HarmCategory.HARM_CATEGORY_HATE_SPEECH, HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE),
+        (HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE),
+        (HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, HarmBlockThreshold.BLOCK_ONLY_HIGH),  # Allow medical content
+    )
 ]
 
 # Generation configuration - Lower temperature for more consistent, factual responses
-GENERATION_CONFIG = {
+_BASE_GENERATION = {
     "temperature": 0.3,  # Lower = more factual, less creative
     "top_p": 0.95,
     "top_k": 40,
-    "max_output_tokens": 2048,
 }
 
+GENERATION_CONFIG = genai.types.GenerationConfig(**_BASE_GENERATION, max_output_tokens=2048)
+
+# Per-task configs. gemini-2.5-flash thinks before answering and thinking tokens
+# count against max_output_tokens (this SDK can't disable it), so every ceiling
+# leaves room for them ahead of the answer; a response that still hits the limit
+# raises TruncatedResponseError rather than returning partial instructions.
+STRUCTURED_CONFIG = genai.types.GenerationConfig(**_BASE_GENERATION, max_output_tokens=2048)   # Image analysis
+FIRST_AID_CONFIG = genai.types.GenerationConfig(**_BASE_GENERATION, max_output_tokens=2048)    # First aid steps
+FOLLOWUP_CONFIG = genai.types.GenerationConfig(**_BASE_GENERATION, max_output_tokens=2048)     # Record follow-up and chat
+CLASSIFIER_CONFIG = genai.types.GenerationConfig(temperature=0.2, max_output_tokens=1024)      # One-word emergency level
+WARMUP_CONFIG = genai.types.GenerationConfig(temperature=0.0, max_output_tokens=1)             # Startup connection warmup
+
+# Uploads within these limits are sent as raw bytes instead of a decoded PIL image
+DIRECT_UPLOAD_MIME_TYPES = {"image/jpeg", "image/png"}
+DIRECT_UPLOAD_MAX_BYTES = 1024 * 1024
+DIRECT_UPLOAD_MAX_DIMENSION = 1024
+
+# Static system prompts (see _model_with_system_prompt)
+IMAGE_ANALYSIS_SYSTEM_PROMPT = """You are a medical first aid assistant analyzing an injury image. 
+        Your task is to:
+        1. Describe the visible injury or condition clearly and medically accurately
+        2. Assess the severity level: MINOR, MODERATE, or SEVERE
+        3. Note any visible signs of emergency (excessive bleeding, deformity, etc.)
+        4. Provide initial observations only - NOT diagnosis or treatment
+        
+        Respond in this structured format:
+        ANALYSIS: [Detailed description of what you see]
+        SEVERITY: [MINOR/MODERATE/SEVERE]
+        OBSERVATIONS: [Key visible signs]
+        """
 
-def get_medical_disclaimer():
-    """Returns a standard medical disclaimer."""
-    return """
+FIRST_AID_SYSTEM_PROMPT = """You are a certified first aid instructor providing step-by-step first aid instructions.
+        
+        IMPORTANT SAFETY GUIDELINES:
+        - Only provide standard, well-established first aid procedures
+        - Always prioritize safety: Check for danger, ensure scene is safe
+        - For severe injuries, emphasize seeking professional medical care immediately
+        - Never diagnose conditions - only provide first aid guidance
+        - Include when to seek professional medical help
+        
+        Structure your response as:
+        IMMEDIATE_ACTIONS: [What to do first - ensure safety]
+        STEPS: [Numbered step-by-step instructions]
+        WARNINGS: [Important safety warnings]
+        WHEN_TO_SEEK_HELP: [Clear indicators for professional medical care]
+        """
+
+FOLLOW_UP_SYSTEM_PROMPT = """You are a certified first aid instructor and medical follow-up care advisor. 
+        Your role is to analyze existing injury records and provide:
+        1. Recovery progress assessment
+        2. Medication management recommendations
+        3. Follow-up care instructions
+        4. Warning signs to watch for
+        5. When to seek additional medical attention
+        
+        Be specific, actionable, and safety-focused. Always emphasize professional medical care when needed."""
+
+# Session-scoped memoization of Gemini results (see _session_cache)
+SESSION_CACHE_KEY = "_gemini_cache"
+SESSION_CACHE_TTL = 300  # seconds
+_session_cache_lock = threading.Lock()  # analyze_records_batch fills it from worker threads
+
+
+@st.cache_resource(show_spinner=False)
+def warmup() -> bool:
+    """
+    Warm up the Gemini endpoint once per server process.
+    Sends a one-token request in a background thread so DNS + TCP + TLS setup is
+    paid before the first user click; later calls reuse the SDK's shared client.
+    """
+    def _ping():
+        try:
+            model = genai.GenerativeModel(TEXT_MODEL, generation_config=WARMUP_CONFIG)
+            model.generate_content("ok")
+        except Exception:
+            # Warmup is best-effort; the real request will surface any error
+            pass
+
+    threading.Thread(target=_ping, daemon=True).start()
+    return True
+
+
+class BlockedContentError(Exception):
+    """Raised when Gemini blocks the prompt or response via safety filters."""
+
+
+class EmptyResponseError(Exception):
+    """Raised when Gemini returns no usable text."""
+
+
+class TruncatedResponseError(Exception):
+    """Raised when Gemini stops at max_output_tokens before finishing its answer."""
+
+
+def _extract_text(response) -> str:
+    """
+    Returns the stripped text of a Gemini response.
+    
+    Raises:
+        BlockedContentError: the content was blocked by safety filters
+        EmptyResponseError: the response contained no text
+        TruncatedResponseError: the response was cut off at max_output_tokens
+    """
+    candidates = getattr(response, "candidates", None)
+    if candidates and getattr(candidates[0].finish_reason, "name", None) == "MAX_TOKENS":
+        raise TruncatedResponseError("The response was cut off before it was complete. Please try again.")
+    
+    try:
+        text = response.text
+    except (ValueError, genai.types.StopCandidateException) as e:
+        # The SDK raises on .text when there is no valid candidate part
+        feedback = getattr(response, "prompt_feedback", None)
+        if feedback and feedback.block_reason:
+            raise BlockedContentError(
+                f"Content was blocked by safety filters. Reason: {feedback.block_reason}. "
+                "Please try a different image or describe the injury in text."
+            ) from e
+        raise EmptyResponseError("API response was empty. This may be due to safety filters blocking the content.") from e
+    
+    if not text or not text.strip():
+        raise EmptyResponseError("API response was empty.")
+    return text.strip()
+
+
+# Severity line in a structured image analysis response, and the grades on it
+_SEV_RE = re.compile(r"SEVERITY\W*([^\n]*)", re.I)  # \W* also skips markdown like **
+_GRADE_RE = re.compile(r"\b(MINOR|MODERATE|SEVERE|UNKNOWN)\b", re.I)
+_GRADE_RANK = {"UNKNOWN": 0, "MINOR": 1, "MODERATE": 2, "SEVERE": 3}
+
+
+def _parse_severity(analysis_text: str) -> str:
+    """
+    Returns the highest grade named on the SEVERITY line(s), so a hedged
+    "MODERATE to SEVERE" is treated as SEVERE. UNKNOWN if none is given.
+    """
+    grades = [g.upper() for line in _SEV_RE.findall(analysis_text) for g in _GRADE_RE.findall(line)]
+    return max(grades, key=_GRADE_RANK.__getitem__, default="UNKNOWN")
+
+
+def _model_with_system_prompt(model_name: str, system_prompt: str, generation_config):
+    """
+    Returns a GenerativeModel with a static system prompt as its system_instruction.
+    The prompts are below Gemini's minimum context-cache size, so they are sent inline.
+    """
+    return genai.GenerativeModel(
+        model_name,
+        safety_settings=SAFETY_SETTINGS,
+        generation_config=generation_config,
+        system_instruction=system_prompt,
+    )
+
+
+def _prepare_image(uploaded_file):
+    """
+    Returns image content for generate_content.
+    Small JPEG/PNG uploads are passed as raw bytes, skipping a full PIL decode and
+    re-encode; anything else falls back to a PIL image.
+    """
+    image = Image.open(uploaded_file)  # Lazy - only the header is read here
+    mime_type = getattr(uploaded_file, "type", None)
+    size = getattr(uploaded_file, "size", None)
+    
+    if (
+        mime_type in DIRECT_UPLOAD_MIME_TYPES
+        and size is not None and size <= DIRECT_UPLOAD_MAX_BYTES
+        and max(image.size) <= DIRECT_UPLOAD_MAX_DIMENSION
+    ):
+        return {"mime_type": mime_type, "data": uploaded_file.getvalue()}
+    return image
+
+
+def _file_digest(uploaded_file) -> str:
+    """Returns a content hash of an uploaded file, used as its cache key."""
+    return hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+
+
+def _session_cache(ttl: int = SESSION_CACHE_TTL, key_fn=None):
+    """
+    Memoize a Gemini call in st.session_state for ttl seconds.
+    Streamlit reruns the whole script on every widget change, so identical calls
+    within one session are served from the cache instead of a new round-trip.
+    Exceptions are not cached.
+    
+    Args:
+        ttl: Seconds a cached result stays valid
+        key_fn: Optional callable mapping the call arguments to a JSON-able key
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key_source = key_fn(*args, **kwargs) if key_fn else [args, kwargs]
+            payload = fn.__name__ + json.dumps(key_source, sort_keys=True, default=str)
+            key = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+            
+            with _session_cache_lock:
+                cache = st.session_state.setdefault(SESSION_CACHE_KEY, {})
+                now = time.time()
+                entry = cache.get(key)
+            if entry and now - entry[0] < ttl:
+                return entry[1]
+            
+            result = fn(*args, **kwargs)
+            with _session_cache_lock:
+                # Drop expired entries so a long session doesn't keep every past analysis
+                for stale in [k for k, (ts, _) in cache.items() if now - ts >= ttl]:
+                    del cache[stale]
+                cache[key] = (now, result)
+            return result
+        return wrapper
+    return decorator
+
+
+MEDICAL_DISCLAIMER = """
     ⚠️ **MEDICAL DISCLAIMER**: 
     This AI assistant provides general first aid information only and is NOT a substitute for professional medical care. 
     Always seek immediate professional medical attention for serious injuries, especially if there's:
@@ -45,101 +270,65 @@ def get_medical_disclaimer():
     """
 
 
-def analyze_image(uploaded_file, return_structured=False):
-    """
-    Analyze an image using the Gemini Vision model.
-    Enhanced version with severity assessment and structured output.
-    """
-    try:
-        image = Image.open(uploaded_file)
+def get_medical_disclaimer():
+    """Returns a standard medical disclaimer."""
+    return MEDICAL_DISCLAIMER
+
+
+@_session_cache(key_fn=lambda uploaded_file, return_structured: (_file_digest(uploaded_file), return_structured))
+def _analyze_image(uploaded_file, return_structured: bool):
+    """Runs the image analysis; errors propagate so they are never cached."""
+    image = _prepare_image(uploaded_file)
+
+    if return_structured:
+        # Enhanced prompt with structured output
+        model = _model_with_system_prompt(VISION_MODEL, IMAGE_ANALYSIS_SYSTEM_PROMPT, STRUCTURED_CONFIG)
+        
+        user_prompt = """Analyze this injury image following the guidelines. 
+        Be specific about what you can see (color, size, location, any visible damage).
+        Assess severity based on visible indicators only."""
+        
+        response = model.generate_content([user_prompt, image])
+        
+        # Blocked, empty and truncated responses propagate to analyze_image's
+        # "Unable to analyze" result, so they are never cached or read as "no injury"
+        analysis_text = _extract_text(response)
+        
+        # Parse structured response
+        result = {
+            "analysis": analysis_text,
+            "severity": _parse_severity(analysis_text),
+            "recommendation": "Consult with healthcare professional."
+        }
+        
+        # Add recommendation based on severity
+        if "SEVERE" in result["severity"]:
+            result["recommendation"] = "🚨 URGENT: Seek immediate professional medical attention. Call emergency services if needed."
+        elif "MODERATE" in result["severity"]:
+            result["recommendation"] = "⚠️ Recommend seeing a healthcare professional soon, within 24 hours."
+        elif "MINOR" in result["severity"]:
+            result["recommendation"] = "✅ Minor injury. Follow first aid steps and monitor. See a doctor if symptoms worsen."
+        
+        return result
+    else:
+        # Original simple prompt for backward compatibility
         model = genai.GenerativeModel(
             VISION_MODEL,
             safety_settings=SAFETY_SETTINGS,
-            generation_config=GENERATION_CONFIG
+            generation_config=STRUCTURED_CONFIG
         )
+        prompt = "Describe clearly and medically what visible injury or condition appears in this image."
+        response = model.generate_content([prompt, image])
+        return _extract_text(response)
 
-        if return_structured:
-            # Enhanced prompt with structured output
-            system_prompt = """You are a medical first aid assistant analyzing an injury image. 
-            Your task is to:
-            1. Describe the visible injury or condition clearly and medically accurately
-            2. Assess the severity level: MINOR, MODERATE, or SEVERE
-            3. Note any visible signs of emergency (excessive bleeding, deformity, etc.)
-            4. Provide initial observations only - NOT diagnosis or treatment
-            
-            Respond in this structured format:
-            ANALYSIS: [Detailed description of what you see]
-            SEVERITY: [MINOR/MODERATE/SEVERE]
-            OBSERVATIONS: [Key visible signs]
-            """
-            
-            user_prompt = """Analyze this injury image following the guidelines. 
-            Be specific about what you can see (color, size, location, any visible damage).
-            Assess severity based on visible indicators only."""
-            
-            response = model.generate_content([system_prompt, user_prompt, image])
-            
-            # Check for blocked content before accessing response
-            if hasattr(response, "prompt_feedback") and response.prompt_feedback:
-                if hasattr(response.prompt_feedback, "block_reason") and response.prompt_feedback.block_reason:
-                    block_reason = str(response.prompt_feedback.block_reason)
-                    raise Exception(f"Content was blocked by safety filters. Reason: {block_reason}. Please try a different image or describe the injury in text.")
-            
-            # Check if response has candidates
-            if not hasattr(response, "candidates") or not response.candidates:
-                raise Exception("API response was empty. This may be due to safety filters blocking the content.")
-            
-            if hasattr(response, "text") and response.text:
-                analysis_text = response.text.strip()
-                
-                # Parse structured response
-                result = {
-                    "analysis": analysis_text,
-                    "severity": "UNKNOWN",
-                    "recommendation": "Consult with healthcare professional."
-                }
-                
-                # Extract severity from response
-                if "SEVERITY:" in analysis_text:
-                    severity_line = [line for line in analysis_text.split("\n") if "SEVERITY:" in line]
-                    if severity_line:
-                        severity = severity_line[0].split("SEVERITY:")[-1].strip().upper()
-                        result["severity"] = severity
-                
-                # Add recommendation based on severity
-                if "SEVERE" in result["severity"]:
-                    result["recommendation"] = "🚨 URGENT: Seek immediate professional medical attention. Call emergency services if needed."
-                elif "MODERATE" in result["severity"]:
-                    result["recommendation"] = "⚠️ Recommend seeing a healthcare professional soon, within 24 hours."
-                elif "MINOR" in result["severity"]:
-                    result["recommendation"] = "✅ Minor injury. Follow first aid steps and monitor. See a doctor if symptoms worsen."
-                
-                return result
-            
-            return {
-                "analysis": "No visible injury detected in the image.",
-                "severity": "UNKNOWN",
-                "recommendation": "If you have concerns, consult a healthcare professional."
-            }
-        else:
-            # Original simple prompt for backward compatibility
-            prompt = "Describe clearly and medically what visible injury or condition appears in this image."
-            response = model.generate_content([prompt, image])
-            
-            # Check for blocked content
-            if hasattr(response, "prompt_feedback") and response.prompt_feedback:
-                if hasattr(response.prompt_feedback, "block_reason") and response.prompt_feedback.block_reason:
-                    block_reason = str(response.prompt_feedback.block_reason)
-                    raise Exception(f"Content was blocked by safety filters. Reason: {block_reason}. Please try a different image or describe the injury in text.")
-            
-            # Check if response has candidates
-            if not hasattr(response, "candidates") or not response.candidates:
-                raise Exception("API response was empty. This may be due to safety filters blocking the content.")
-            
-            if hasattr(response, "text") and response.text:
-                return response.text.strip()
-            return "No description detected."
 
+def analyze_image(uploaded_file, return_structured=False):
+    """
+    Analyze an image using the Gemini Vision model.
+    Enhanced version with severity assessment and structured output.
+    """
+    try:
+        return _analyze_image(uploaded_file, return_structured)
     except Exception as e:
         # Check if the error is related to a missing model and provide a helpful tip
         if "404" in str(e) and "models" in str(e):
@@ -156,16 +345,39 @@ def analyze_image(uploaded_file, return_structured=False):
         return "Unable to analyze the image."
 
 
+# Unambiguous descriptions are classified locally without a Gemini call.
+# Keywords match whole words. Emergency keywords are checked first, so "minor cut,
+# now unconscious" is still an emergency; a routine keyword alongside a risk term
+# ("heavy bleeding from a minor cut") is left to the model.
+_EMERGENCY_KW_RE = re.compile(r"\b(?:unconscious|not breathing|arterial|cpr|choking|severe bleeding)\b")
+_ROUTINE_KW_RE = re.compile(r"\b(?:scratch|small bruise|minor cut|paper cut)\b")
+_RISK_KW_RE = re.compile(r"\b(?:bleed\w*|blood\w*|eyes?|(?:fore)?head|scalp|deep|won['’]?t stop|will not stop)\b")
+
+
+def _keyword_emergency_level(injury_description: str) -> Optional[str]:
+    """Returns EMERGENCY or ROUTINE for obvious descriptions, None when the model should decide."""
+    desc_lower = injury_description.lower()
+    if _EMERGENCY_KW_RE.search(desc_lower):
+        return "EMERGENCY"
+    if _ROUTINE_KW_RE.search(desc_lower) and not _RISK_KW_RE.search(desc_lower):
+        return "ROUTINE"
+    return None
+
+
 def assess_emergency_level(injury_description: str) -> str:
     """
     Quickly assess if the situation requires immediate emergency attention.
     Returns: "EMERGENCY", "URGENT", or "ROUTINE"
     """
+    level = _keyword_emergency_level(injury_description)
+    if level:
+        return level
+    
     try:
         model = genai.GenerativeModel(
             TEXT_MODEL,
             safety_settings=SAFETY_SETTINGS,
-            generation_config={"temperature": 0.2, "max_output_tokens": 50}
+            generation_config=CLASSIFIER_CONFIG
         )
 
         prompt = f"""Based on this description: "{injury_description}", classify as:
@@ -176,95 +388,88 @@ def assess_emergency_level(injury_description: str) -> str:
         Respond with only one word: EMERGENCY, URGENT, or ROUTINE"""
         
         response = model.generate_content(prompt)
-        if hasattr(response, "text") and response.text:
-            level = response.text.strip().upper()
-            if "EMERGENCY" in level:
-                return "EMERGENCY"
-            elif "URGENT" in level:
-                return "URGENT"
-            else:
-                return "ROUTINE"
+        try:
+            level = _extract_text(response).upper()
+        except (BlockedContentError, EmptyResponseError):
+            return "URGENT"
         
-        return "ROUTINE"
+        if "EMERGENCY" in level:
+            return "EMERGENCY"
+        elif "URGENT" in level:
+            return "URGENT"
+        elif "ROUTINE" in level:
+            return "ROUTINE"
+        return "URGENT"
     
     except Exception as e:
-        # Default to ROUTINE on error to avoid false emergencies
-        return "ROUTINE"
+        # Fail safe: without a classification, advise prompt medical attention
+        return "URGENT"
 
 
-def generate_first_aid_steps(injury_description, severity=None, return_structured=False):
-    """
-    Generate short, step-by-step first aid instructions.
-    Enhanced version with severity awareness and structured output.
-    """
-    try:
-        model = genai.GenerativeModel(
-            TEXT_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config=GENERATION_CONFIG
-        )
+@_session_cache()
+def _generate_first_aid_steps(injury_description, severity, return_structured: bool):
+    """Generates first aid steps; errors propagate so they are never cached."""
+    if return_structured:
+        # Enhanced system prompt with safety guidelines
+        model = _model_with_system_prompt(TEXT_MODEL, FIRST_AID_SYSTEM_PROMPT, FIRST_AID_CONFIG)
 
-        if return_structured:
-            # Enhanced system prompt with safety guidelines
-            system_prompt = """You are a certified first aid instructor providing step-by-step first aid instructions.
-            
-            IMPORTANT SAFETY GUIDELINES:
-            - Only provide standard, well-established first aid procedures
-            - Always prioritize safety: Check for danger, ensure scene is safe
-            - For severe injuries, emphasize seeking professional medical care immediately
-            - Never diagnose conditions - only provide first aid guidance
-            - Include when to seek professional medical help
-            
-            Structure your response as:
-            IMMEDIATE_ACTIONS: [What to do first - ensure safety]
-            STEPS: [Numbered step-by-step instructions]
-            WARNINGS: [Important safety warnings]
-            WHEN_TO_SEEK_HELP: [Clear indicators for professional medical care]
-            """
-
-            # Context-aware user prompt
-            severity_context = ""
-            if severity:
-                severity_context = f"Severity assessed as: {severity}. Adjust instructions accordingly. "
-            
-            user_prompt = f"""Provide safe, step-by-step first aid instructions for: {injury_description}.
-            
-            {severity_context}
-            Remember:
-            - Be clear and concise
-            - Prioritize safety
-            - Use simple language that anyone can follow
-            - Include specific warnings if applicable
-            - Always mention when professional medical attention is needed
-            """
-            
-            response = model.generate_content([system_prompt, user_prompt])
-            
-            if hasattr(response, "text") and response.text:
-                steps_text = response.text.strip()
-                
-                # Parse structured response
-                result = {
-                    "steps": steps_text,
-                    "has_warnings": "WARNINGS:" in steps_text or "URGENT" in steps_text.upper(),
-                    "needs_emergency": "SEVERE" in str(severity).upper() if severity else False
-                }
-                
-                return result
-            
+        # Context-aware user prompt
+        severity_context = ""
+        if severity:
+            severity_context = f"Severity assessed as: {severity}. Adjust instructions accordingly. "
+        
+        user_prompt = f"""Provide safe, step-by-step first aid instructions for: {injury_description}.
+        
+        {severity_context}
+        Remember:
+        - Be clear and concise
+        - Prioritize safety
+        - Use simple language that anyone can follow
+        - Include specific warnings if applicable
+        - Always mention when professional medical attention is needed
+        """
+        
+        response = model.generate_content(user_prompt)
+        
+        try:
+            steps_text = _extract_text(response)
+        except EmptyResponseError:
             return {
                 "steps": "Unable to generate first aid instructions. Please consult a healthcare professional.",
                 "has_warnings": True,
                 "needs_emergency": False
             }
-        else:
-            # Original simple prompt for backward compatibility
-            prompt = f"Provide concise, safe, step-by-step first aid instructions for: {injury_description}."
-            response = model.generate_content(prompt)
-            if hasattr(response, "text") and response.text:
-                return response.text.strip()
+        
+        # Parse structured response
+        result = {
+            "steps": steps_text,
+            "has_warnings": "WARNINGS:" in steps_text or "URGENT" in steps_text.upper(),
+            "needs_emergency": "SEVERE" in str(severity).upper() if severity else False
+        }
+        
+        return result
+    else:
+        # Original simple prompt for backward compatibility
+        model = genai.GenerativeModel(
+            TEXT_MODEL,
+            safety_settings=SAFETY_SETTINGS,
+            generation_config=FIRST_AID_CONFIG
+        )
+        prompt = f"Provide concise, safe, step-by-step first aid instructions for: {injury_description}."
+        response = model.generate_content(prompt)
+        try:
+            return _extract_text(response)
+        except EmptyResponseError:
             return "No first aid steps generated."
 
+
+def generate_first_aid_steps(injury_description, severity=None, return_structured=False):
+    """
+    Generate short, step-by-step first aid instructions.
+    Enhanced version with severity awareness and structured output.
+    """
+    try:
+        return _generate_first_aid_steps(injury_description, severity, return_structured)
     except Exception as e:
         st.error(f"Error generating first aid steps: {e}")
         if return_structured:
@@ -276,72 +481,72 @@ def generate_first_aid_steps(injury_description, severity=None, return_structure
         return "Unable to generate first aid instructions."
 
 
-def analyze_existing_record(record: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Analyze an existing health record and provide follow-up care recommendations.
-    
-    Args:
-        record: Health record dictionary
-        
-    Returns:
-        Dict with follow-up analysis, medication recommendations, recovery assessment
-    """
+# Follow-up response sections -> result keys
+FOLLOW_UP_SECTIONS = {
+    "RECOVERY_ASSESSMENT": "recovery_assessment",
+    "MEDICATION_RECOMMENDATIONS": "medication_recommendations",
+    "FOLLOW_UP_CARE": "follow_up_care",
+    "WARNING_SIGNS": "warning_signs",
+    "WHEN_TO_SEEK_HELP": "when_to_seek_help",
+    "RECOVERY_TIMELINE": "recovery_timeline"
+}
+
+# Retry settings for rate-limited (429) / temporarily unavailable Gemini calls
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0  # seconds, doubled on each attempt
+
+
+def _follow_up_result(follow_up_analysis: str) -> Dict[str, Any]:
+    """Returns a follow-up result dict with empty sections."""
+    result = {"follow_up_analysis": follow_up_analysis}
+    result.update({value: "" for value in FOLLOW_UP_SECTIONS.values()})
+    return result
+
+
+def _days_since(iso_ts: str) -> int:
+    """Returns whole days elapsed since an ISO timestamp, or 0 if it can't be parsed."""
     try:
-        model = genai.GenerativeModel(
-            TEXT_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config=GENERATION_CONFIG
-        )
-        
-        # Build context from record
-        injury_type = record.get('injury_type', 'Unknown')
-        severity = record.get('severity', 'UNKNOWN')
-        status = record.get('status', 'active')
-        body_part = record.get('body_part', 'Unknown')
-        initial_analysis = record.get('initial_analysis', {}).get('ai_analysis', '')
-        
-        # Recovery data
-        recovery = record.get('recovery', {})
-        progress = recovery.get('progress_percentage', 0)
-        pain_level = recovery.get('pain_level')
-        recovery_status = recovery.get('status', 'initial')
-        recovery_updates = recovery.get('updates', [])
-        
-        # Medication data
-        medications = record.get('medications', [])
-        med_list = []
-        for med in medications:
-            med_list.append(f"- {med.get('name', 'Unknown')}: {med.get('dosage', '')} {med.get('frequency', '')}")
-        medications_str = "\n".join(med_list) if med_list else "No medications recorded"
-        
-        # Time since injury
-        from datetime import datetime
-        try:
-            injury_date = datetime.fromisoformat(record.get('timestamp', ''))
-            days_since = (datetime.now() - injury_date).days
-        except:
-            days_since = 0
-        
-        # Notes
-        notes = record.get('notes', [])
-        recent_notes = notes[-3:] if len(notes) > 3 else notes
-        notes_str = "\n".join([f"- {note.get('content', '')}" for note in recent_notes]) if recent_notes else "No recent notes"
-        
-        # Photos available
-        photos = record.get('photos', {})
-        has_progress_photos = len(photos.get('during', [])) > 0 or len(photos.get('after', [])) > 0
-        
-        system_prompt = """You are a certified first aid instructor and medical follow-up care advisor. 
-        Your role is to analyze existing injury records and provide:
-        1. Recovery progress assessment
-        2. Medication management recommendations
-        3. Follow-up care instructions
-        4. Warning signs to watch for
-        5. When to seek additional medical attention
-        
-        Be specific, actionable, and safety-focused. Always emphasize professional medical care when needed."""
-        
-        user_prompt = f"""Analyze this injury record and provide follow-up care recommendations:
+        return (datetime.now() - datetime.fromisoformat(iso_ts)).days
+    except (ValueError, TypeError):
+        return 0
+
+
+def _build_follow_up_prompt(record: Dict[str, Any]) -> str:
+    """Builds the follow-up analysis user prompt from a health record."""
+    # Build context from record
+    injury_type = record.get('injury_type', 'Unknown')
+    severity = record.get('severity', 'UNKNOWN')
+    status = record.get('status', 'active')
+    body_part = record.get('body_part', 'Unknown')
+    initial_analysis = record.get('initial_analysis', {}).get('ai_analysis', '')
+    
+    # Recovery data
+    recovery = record.get('recovery', {})
+    progress = recovery.get('progress_percentage', 0)
+    pain_level = recovery.get('pain_level')
+    recovery_status = recovery.get('status', 'initial')
+    recovery_updates = recovery.get('updates', [])
+    
+    # Medication data
+    medications = record.get('medications', [])
+    med_list = []
+    for med in medications:
+        med_list.append(f"- {med.get('name', 'Unknown')}: {med.get('dosage', '')} {med.get('frequency', '')}")
+    medications_str = "\n".join(med_list) if med_list else "No medications recorded"
+    
+    # Time since injury
+    days_since = _days_since(record.get('timestamp', ''))
+    
+    # Notes
+    notes = record.get('notes', [])
+    recent_notes = notes[-3:] if len(notes) > 3 else notes
+    notes_str = "\n".join([f"- {note.get('content', '')}" for note in recent_notes]) if recent_notes else "No recent notes"
+    
+    # Photos available
+    photos = record.get('photos', {})
+    has_progress_photos = len(photos.get('during', [])) > 0 or len(photos.get('after', [])) > 0
+    
+    return f"""Analyze this injury record and provide follow-up care recommendations:
 
 INJURY INFORMATION:
 - Type: {injury_type}
@@ -374,77 +579,112 @@ Please provide:
 6. RECOVERY_TIMELINE: Expected recovery timeline based on current progress
 
 Structure your response clearly with these sections."""
-        
-        response = model.generate_content([system_prompt, user_prompt])
-        
-        if hasattr(response, "text") and response.text:
-            analysis_text = response.text.strip()
-            
-            # Parse structured response
-            result = {
-                "follow_up_analysis": analysis_text,
-                "recovery_assessment": "",
-                "medication_recommendations": "",
-                "follow_up_care": "",
-                "warning_signs": "",
-                "when_to_seek_help": "",
-                "recovery_timeline": ""
-            }
-            
-            # Try to extract structured sections
-            sections = {
-                "RECOVERY_ASSESSMENT": "recovery_assessment",
-                "MEDICATION_RECOMMENDATIONS": "medication_recommendations",
-                "FOLLOW_UP_CARE": "follow_up_care",
-                "WARNING_SIGNS": "warning_signs",
-                "WHEN_TO_SEEK_HELP": "when_to_seek_help",
-                "RECOVERY_TIMELINE": "recovery_timeline"
-            }
-            
-            for key, value in sections.items():
-                if key in analysis_text:
-                    # Extract section content
-                    lines = analysis_text.split('\n')
-                    in_section = False
-                    section_content = []
-                    for line in lines:
-                        if key in line:
-                            in_section = True
-                            # Remove the section header
-                            content = line.split(':', 1)
-                            if len(content) > 1:
-                                section_content.append(content[1].strip())
-                            continue
-                        if in_section:
-                            if any(other_key in line for other_key in sections.keys() if other_key != key):
-                                break
-                            if line.strip():
-                                section_content.append(line.strip())
-                    result[value] = "\n".join(section_content) if section_content else ""
-            
-            return result
-        
-        return {
-            "follow_up_analysis": "Unable to generate follow-up analysis. Please consult a healthcare professional.",
-            "recovery_assessment": "",
-            "medication_recommendations": "",
-            "follow_up_care": "",
-            "warning_signs": "",
-            "when_to_seek_help": "",
-            "recovery_timeline": ""
-        }
+
+
+def _parse_follow_up_response(response) -> Dict[str, Any]:
+    """Parses a follow-up analysis response into its structured sections."""
+    try:
+        analysis_text = _extract_text(response)
+    except EmptyResponseError:
+        return _follow_up_result("Unable to generate follow-up analysis. Please consult a healthcare professional.")
+    
+    # Parse structured response
+    result = _follow_up_result(analysis_text)
+    
+    # Try to extract structured sections
+    for key, value in FOLLOW_UP_SECTIONS.items():
+        if key in analysis_text:
+            # Extract section content
+            lines = analysis_text.split('\n')
+            in_section = False
+            section_content = []
+            for line in lines:
+                if key in line:
+                    in_section = True
+                    # Remove the section header
+                    content = line.split(':', 1)
+                    if len(content) > 1:
+                        section_content.append(content[1].strip())
+                    continue
+                if in_section:
+                    if any(other_key in line for other_key in FOLLOW_UP_SECTIONS.keys() if other_key != key):
+                        break
+                    if line.strip():
+                        section_content.append(line.strip())
+            result[value] = "\n".join(section_content) if section_content else ""
+    
+    return result
+
+
+def _with_retry(make_call, attempts: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY):
+    """
+    Run a Gemini call, retrying with exponential backoff on rate limits (429)
+    and temporary unavailability (503).
+    
+    Args:
+        make_call: Zero-argument callable making one attempt
+    """
+    for attempt in range(attempts):
+        try:
+            return make_call()
+        except (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(base_delay * (2 ** attempt))
+
+
+@_session_cache()
+def _analyze_existing_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs the follow-up analysis; errors propagate so they are never cached."""
+    model = _model_with_system_prompt(TEXT_MODEL, FOLLOW_UP_SYSTEM_PROMPT, FOLLOWUP_CONFIG)
     
+    user_prompt = _build_follow_up_prompt(record)
+    response = model.generate_content(user_prompt)
+    return _parse_follow_up_response(response)
+
+
+def analyze_existing_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Analyze an existing health record and provide follow-up care recommendations.
+    
+    Args:
+        record: Health record dictionary
+        
+    Returns:
+        Dict with follow-up analysis, medication recommendations, recovery assessment
+    """
+    try:
+        return _analyze_existing_record(record)
     except Exception as e:
         st.error(f"Error analyzing record: {e}")
-        return {
-            "follow_up_analysis": f"Error: {str(e)}. Please try again or consult a healthcare professional.",
-            "recovery_assessment": "",
-            "medication_recommendations": "",
-            "follow_up_care": "",
-            "warning_signs": "",
-            "when_to_seek_help": "",
-            "recovery_timeline": ""
-        }
+        return _follow_up_result(f"Error: {str(e)}. Please try again or consult a healthcare professional.")
+
+
+def analyze_records_batch(records: List[Dict[str, Any]], concurrency: int = 5) -> List[Dict[str, Any]]:
+    """
+    Analyze several health records concurrently, retrying on rate limits.
+    Runs on worker threads with the script run context rather than an event
+    loop, since the SDK's async client stays bound to the first loop it used.
+    
+    Args:
+        records: Health record dictionaries
+        concurrency: Maximum number of Gemini calls in flight (rate-limit guard)
+        
+    Returns:
+        Follow-up analysis dicts, in the same order as records
+    """
+    ctx = get_script_run_ctx()
+    
+    def analyze(record: Dict[str, Any]) -> Dict[str, Any]:
+        add_script_run_ctx(threading.current_thread(), ctx)
+        try:
+            return _with_retry(lambda: _analyze_existing_record(record))
+        except Exception as e:
+            st.error(f"Error analyzing record: {e}")
+            return _follow_up_result(f"Error: {str(e)}. Please try again or consult a healthcare professional.")
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(analyze, records))
 
 
 def chat_about_record(record: Dict[str, Any], user_message: str, chat_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
@@ -463,7 +703,7 @@ def chat_about_record(record: Dict[str, Any], user_message: str, chat_history: O
         model = genai.GenerativeModel(
             TEXT_MODEL,
             safety_settings=SAFETY_SETTINGS,
-            generation_config=GENERATION_CONFIG
+            generation_config=FOLLOWUP_CONFIG
         )
         
         # Build record context
@@ -471,13 +711,7 @@ def chat_about_record(record: Dict[str, Any], user_message: str, chat_history: O
         severity = record.get('severity', 'UNKNOWN')
         status = record.get('status', 'active')
         body_part = record.get('body_part', 'Unknown')
-        days_old = 0
-        try:
-            from datetime import datetime
-            injury_date = datetime.fromisoformat(record.get('timestamp', ''))
-            days_old = (datetime.now() - injury_date).days
-        except:
-            pass
+        days_old = _days_since(record.get('timestamp', ''))
         
         recovery = record.get('recovery', {})
         progress = recovery.get('progress_percentage', 0)
@@ -536,24 +770,24 @@ Provide a helpful, conversational response based on the injury record context ab
         
         response = model.generate_content([system_prompt, user_prompt])
         
-        if hasattr(response, "text") and response.text:
-            assistant_response = response.text.strip()
-            
-            # Update chat history
-            updated_history = chat_history.copy()
-            updated_history.append({"role": "user", "content": user_message})
-            updated_history.append({"role": "assistant", "content": assistant_response})
-            
+        try:
+            assistant_response = _extract_text(response)
+        except EmptyResponseError:
             return {
-                "response": assistant_response,
-                "chat_history": updated_history,
-                "success": True
+                "response": "I'm sorry, I couldn't generate a response. Please try again or consult a healthcare professional.",
+                "chat_history": chat_history,
+                "success": False
             }
         
+        # Update chat history
+        updated_history = chat_history.copy()
+        updated_history.append({"role": "user", "content": user_message})
+        updated_history.append({"role": "assistant", "content": assistant_response})
+        
         return {
-            "response": "I'm sorry, I couldn't generate a response. Please try again or consult a healthcare professional.",
-            "chat_history": chat_history,
-            "success": False
+            "response": assistant_response,
+            "chat_history": updated_history,
+            "success": True
         }
     
     except Exception as e:
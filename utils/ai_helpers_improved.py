@@ -14,8 +14,18 @@ Key improvements:
 import streamlit as st
 import google.generativeai as genai
 from PIL import Image
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, TypedDict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import functools
+import hashlib
+import io
+import json
+import threading
 import time
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.ai_helpers import _keyword_emergency_level
 
 # Configure Gemini API
 genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
@@ -40,10 +50,133 @@ GENERATION_CONFIG = {
     "max_output_tokens": 2048,
 }
 
+# Emergency classification - one-word answer
+CLASSIFIER_CONFIG = {"temperature": 0.2, "max_output_tokens": 50}
+
+# Follow-up questions - short numbered list
+FOLLOW_UP_CONFIG = {"temperature": 0.5, "max_output_tokens": 200}
+
+
+# Response schema for the single-call injury analysis.
+# Kept flat with short keys and enums - cheaper to constrain and decode - and
+# expanded to readable names client-side via REPORT_KEYS.
+INJURY_REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sev": {"type": "string", "format": "enum", "enum": ["MINOR", "MODERATE", "SEVERE"]},
+        "lvl": {"type": "string", "format": "enum", "enum": ["EMERGENCY", "URGENT", "ROUTINE"]},
+        "obs": {"type": "string"},
+        "steps": {"type": "array", "items": {"type": "string"}},
+        "warn": {"type": "array", "items": {"type": "string"}},
+        "help": {"type": "string"},
+        "ask": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["sev", "lvl", "obs", "steps"],
+}
+REPORT_KEYS = {
+    "obs": "analysis",
+    "sev": "severity",
+    "lvl": "emergency_level",
+    "steps": "steps",
+    "warn": "warnings",
+    "help": "when_to_seek_help",
+    "ask": "follow_up",
+}
 
-def get_medical_disclaimer():
-    """Returns a standard medical disclaimer."""
-    return """
+# Full injury report - JSON constrained to INJURY_REPORT_SCHEMA
+REPORT_CONFIG = {
+    **GENERATION_CONFIG,
+    "response_mime_type": "application/json",
+    "response_schema": INJURY_REPORT_SCHEMA,
+}
+
+
+class ImageAnalysis(TypedDict):
+    """Response schema for image analysis."""
+    analysis: str
+    severity: str           # MINOR, MODERATE or SEVERE
+    observations: str
+
+
+class FirstAidSteps(TypedDict):
+    """Response schema for first aid instructions."""
+    immediate_actions: str
+    steps: List[str]
+    warnings: List[str]
+    when_to_seek_help: str
+
+
+# JSON mode - the model generates values only, never the field labels
+IMAGE_ANALYSIS_CONFIG = {
+    **GENERATION_CONFIG,
+    "response_mime_type": "application/json",
+    "response_schema": ImageAnalysis,
+}
+FIRST_AID_CONFIG = {
+    **GENERATION_CONFIG,
+    "response_mime_type": "application/json",
+    "response_schema": FirstAidSteps,
+}
+
+# Models are built once and shared by every call with the same configuration
+_VISION_MODEL = genai.GenerativeModel(VISION_MODEL, safety_settings=SAFETY_SETTINGS, generation_config=IMAGE_ANALYSIS_CONFIG)
+_REPORT_MODEL = genai.GenerativeModel(VISION_MODEL, safety_settings=SAFETY_SETTINGS, generation_config=REPORT_CONFIG)
+_TEXT_MODEL = genai.GenerativeModel(TEXT_MODEL, safety_settings=SAFETY_SETTINGS, generation_config=FIRST_AID_CONFIG)
+_STREAM_MODEL = genai.GenerativeModel(TEXT_MODEL, safety_settings=SAFETY_SETTINGS, generation_config=GENERATION_CONFIG)
+_QUICK_MODEL = genai.GenerativeModel(TEXT_MODEL, safety_settings=SAFETY_SETTINGS, generation_config=CLASSIFIER_CONFIG)
+_FOLLOW_UP_MODEL = genai.GenerativeModel(TEXT_MODEL, safety_settings=SAFETY_SETTINGS, generation_config=FOLLOW_UP_CONFIG)
+
+# Uploaded photos are downscaled and re-encoded before sending
+MAX_IMAGE_DIMENSION = 1024
+JPEG_QUALITY = 85
+
+# Exact-match response cache (per process)
+EXACT_CACHE_SIZE = 512
+_exact_cache: "OrderedDict[str, Any]" = OrderedDict()
+_exact_cache_lock = threading.Lock()
+
+
+def _make_key(*parts) -> str:
+    """Returns a SHA-256 key for JSON-serializable call parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _arg_key(arg) -> Any:
+    """Returns a hashable stand-in for a call argument (content hash for uploaded files)."""
+    if hasattr(arg, "getvalue"):
+        return hashlib.sha256(arg.getvalue()).hexdigest()
+    return arg
+
+
+def _exact_cached(model_name: str, generation_config: Dict[str, Any]):
+    """
+    Decorator adding an LRU exact-match cache keyed on
+    (model, function, generation config, arguments).
+    Identical repeats (e.g. Streamlit reruns on the same input) cost one hash
+    and skip the Gemini call. Uploaded images are keyed by a SHA-256 of their bytes.
+    The cache is shared by all sessions, so results are stored and returned as
+    deep copies; a caller mutating its result can't change anyone else's.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = _make_key(model_name, fn.__qualname__, generation_config, [_arg_key(a) for a in args])
+            with _exact_cache_lock:
+                if key in _exact_cache:
+                    _exact_cache.move_to_end(key)
+                    return copy.deepcopy(_exact_cache[key])
+            
+            result = fn(*args)
+            with _exact_cache_lock:
+                _exact_cache[key] = copy.deepcopy(result)
+                if len(_exact_cache) > EXACT_CACHE_SIZE:
+                    _exact_cache.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
+
+MEDICAL_DISCLAIMER = """
     ⚠️ **MEDICAL DISCLAIMER**: 
     This AI assistant provides general first aid information only and is NOT a substitute for professional medical care. 
     Always seek immediate professional medical attention for serious injuries, especially if there's:
@@ -58,73 +191,87 @@ def get_medical_disclaimer():
     """
 
 
-def analyze_image_improved(uploaded_file) -> Dict[str, Any]:
+def get_medical_disclaimer():
+    """Returns a standard medical disclaimer."""
+    return MEDICAL_DISCLAIMER
+
+
+# System prompts are constant, so they are kept pre-compressed here:
+# filler and restated instructions removed, every safety rule kept.
+IMAGE_ANALYSIS_SYSTEM_PROMPT = (
+    "Medical first aid assistant. From the injury image: describe visible injury accurately; "
+    "severity MINOR/MODERATE/SEVERE; note emergency signs (heavy bleeding, deformity). "
+    "Observations only - no diagnosis or treatment."
+)
+
+IMAGE_ANALYSIS_USER_PROMPT = "Be specific: color, size, location, visible damage. Judge severity on visible signs only."
+
+FIRST_AID_SYSTEM_PROMPT = (
+    "Certified first aid instructor. Standard, well-established procedures only; no diagnosis. "
+    "Scene safety first. Severe injuries: urge immediate professional care. "
+    "Say when to seek medical help. Clear, simple language."
+)
+
+
+def _prepare_image(uploaded_file) -> Dict[str, Any]:
     """
-    Enhanced image analysis with structured output and severity assessment.
-    Returns a dictionary with analysis, severity, and recommendations.
+    Returns an uploaded photo as a JPEG blob for generate_content.
+    The longest edge is capped at MAX_IMAGE_DIMENSION; vision tokens and upload
+    bytes scale with area, and injury assessment does not need more detail.
     """
-    try:
-        image = Image.open(uploaded_file)
-        model = genai.GenerativeModel(
-            VISION_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config=GENERATION_CONFIG
-        )
-
-        # Enhanced system prompt with medical guidelines
-        system_prompt = """You are a medical first aid assistant analyzing an injury image. 
-        Your task is to:
-        1. Describe the visible injury or condition clearly and medically accurately
-        2. Assess the severity level: MINOR, MODERATE, or SEVERE
-        3. Note any visible signs of emergency (excessive bleeding, deformity, etc.)
-        4. Provide initial observations only - NOT diagnosis or treatment
-        
-        Respond in this structured format:
-        ANALYSIS: [Detailed description of what you see]
-        SEVERITY: [MINOR/MODERATE/SEVERE]
-        OBSERVATIONS: [Key visible signs]
-        """
+    image = Image.open(uploaded_file)
+    image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return {"mime_type": "image/jpeg", "data": buf.getvalue()}
 
-        # Enhanced user prompt
-        user_prompt = """Analyze this injury image following the guidelines. 
-        Be specific about what you can see (color, size, location, any visible damage).
-        Assess severity based on visible indicators only."""
 
-        response = model.generate_content([system_prompt, user_prompt, image])
-        
-        if hasattr(response, "text") and response.text:
-            analysis_text = response.text.strip()
-            
-            # Parse structured response
-            result = {
-                "analysis": analysis_text,
-                "severity": "UNKNOWN",
-                "recommendation": "Consult with healthcare professional."
-            }
-            
-            # Extract severity from response
-            if "SEVERITY:" in analysis_text:
-                severity_line = [line for line in analysis_text.split("\n") if "SEVERITY:" in line]
-                if severity_line:
-                    severity = severity_line[0].split("SEVERITY:")[-1].strip().upper()
-                    result["severity"] = severity
-            
-            # Add recommendation based on severity
-            if "SEVERE" in result["severity"]:
-                result["recommendation"] = "🚨 URGENT: Seek immediate professional medical attention. Call emergency services if needed."
-            elif "MODERATE" in result["severity"]:
-                result["recommendation"] = "⚠️ Recommend seeing a healthcare professional soon, within 24 hours."
-            elif "MINOR" in result["severity"]:
-                result["recommendation"] = "✅ Minor injury. Follow first aid steps and monitor. See a doctor if symptoms worsen."
-            
-            return result
-        
+def _parse_image_analysis(response) -> Dict[str, Any]:
+    """Turns a JSON image analysis response into the analysis/severity/recommendation dict."""
+    if not response.text:
         return {
             "analysis": "No visible injury detected in the image.",
             "severity": "UNKNOWN",
             "recommendation": "If you have concerns, consult a healthcare professional."
         }
+    
+    report = json.loads(response.text)
+    result = {
+        "analysis": report.get("analysis", ""),
+        "severity": str(report.get("severity", "UNKNOWN")).strip().upper() or "UNKNOWN",
+        "observations": report.get("observations", ""),
+        "recommendation": "Consult with healthcare professional."
+    }
+    
+    # Add recommendation based on severity
+    if "SEVERE" in result["severity"]:
+        result["recommendation"] = "🚨 URGENT: Seek immediate professional medical attention. Call emergency services if needed."
+    elif "MODERATE" in result["severity"]:
+        result["recommendation"] = "⚠️ Recommend seeing a healthcare professional soon, within 24 hours."
+    elif "MINOR" in result["severity"]:
+        result["recommendation"] = "✅ Minor injury. Follow first aid steps and monitor. See a doctor if symptoms worsen."
+    
+    return result
+
+
+@_exact_cached(VISION_MODEL, IMAGE_ANALYSIS_CONFIG)
+def _analyze_image_improved(uploaded_file) -> Dict[str, Any]:
+    """Runs the image analysis; errors propagate so they are never cached."""
+    image = _prepare_image(uploaded_file)
+    response = _VISION_MODEL.generate_content([IMAGE_ANALYSIS_SYSTEM_PROMPT, IMAGE_ANALYSIS_USER_PROMPT, image])
+    return _parse_image_analysis(response)
+
 
+def analyze_image_improved(uploaded_file) -> Dict[str, Any]:
+    """
+    Enhanced image analysis with structured output and severity assessment.
+    Returns a dictionary with analysis, severity, and recommendations.
+    """
+    try:
+        return _analyze_image_improved(uploaded_file)
     except Exception as e:
         st.error(f"Error analyzing image: {e}")
         return {
@@ -134,71 +281,50 @@ def analyze_image_improved(uploaded_file) -> Dict[str, Any]:
         }
 
 
+def _format_first_aid_steps(report: Dict[str, Any]) -> str:
+    """Renders a FirstAidSteps JSON object as markdown."""
+    sections = []
+    if report.get("immediate_actions"):
+        sections.append(f"**Immediate actions:** {report['immediate_actions']}")
+    if report.get("steps"):
+        sections.append("\n".join(f"{i}. {step}" for i, step in enumerate(report["steps"], 1)))
+    if report.get("warnings"):
+        sections.append("**Warnings:**\n" + "\n".join(f"- {warning}" for warning in report["warnings"]))
+    if report.get("when_to_seek_help"):
+        sections.append(f"**When to seek help:** {report['when_to_seek_help']}")
+    return "\n\n".join(sections)
+
+
+@_exact_cached(TEXT_MODEL, FIRST_AID_CONFIG)
+def _generate_first_aid_steps_improved(injury_description: str, severity: Optional[str]) -> Dict[str, Any]:
+    """Generates first aid steps; errors propagate so they are never cached."""
+    severity_context = f" Severity: {severity}; adjust accordingly." if severity else ""
+    user_prompt = f"First aid steps for: {injury_description}.{severity_context}"
+    
+    response = _TEXT_MODEL.generate_content([FIRST_AID_SYSTEM_PROMPT, user_prompt])
+    
+    if response.text:
+        report = json.loads(response.text)
+        return {
+            "steps": _format_first_aid_steps(report),
+            "has_warnings": bool(report.get("warnings")),
+            "needs_emergency": "SEVERE" in severity.upper() if severity else False
+        }
+    
+    return {
+        "steps": "Unable to generate first aid instructions. Please consult a healthcare professional.",
+        "has_warnings": True,
+        "needs_emergency": False
+    }
+
+
 def generate_first_aid_steps_improved(injury_description: str, severity: Optional[str] = None) -> Dict[str, Any]:
     """
     Enhanced first aid generation with structured output, safety checks, and context awareness.
     Returns structured response with steps, warnings, and follow-up care.
     """
     try:
-        model = genai.GenerativeModel(
-            TEXT_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config=GENERATION_CONFIG
-        )
-
-        # Enhanced system prompt with safety guidelines
-        system_prompt = """You are a certified first aid instructor providing step-by-step first aid instructions.
-        
-        IMPORTANT SAFETY GUIDELINES:
-        - Only provide standard, well-established first aid procedures
-        - Always prioritize safety: Check for danger, ensure scene is safe
-        - For severe injuries, emphasize seeking professional medical care immediately
-        - Never diagnose conditions - only provide first aid guidance
-        - Include when to seek professional medical help
-        
-        Structure your response as:
-        IMMEDIATE_ACTIONS: [What to do first - ensure safety]
-        STEPS: [Numbered step-by-step instructions]
-        WARNINGS: [Important safety warnings]
-        WHEN_TO_SEEK_HELP: [Clear indicators for professional medical care]
-        """
-
-        # Context-aware user prompt
-        severity_context = ""
-        if severity:
-            severity_context = f"Severity assessed as: {severity}. Adjust instructions accordingly. "
-        
-        user_prompt = f"""Provide safe, step-by-step first aid instructions for: {injury_description}.
-        
-        {severity_context}
-        Remember:
-        - Be clear and concise
-        - Prioritize safety
-        - Use simple language that anyone can follow
-        - Include specific warnings if applicable
-        - Always mention when professional medical attention is needed
-        """
-        
-        response = model.generate_content([system_prompt, user_prompt])
-        
-        if hasattr(response, "text") and response.text:
-            steps_text = response.text.strip()
-            
-            # Parse structured response
-            result = {
-                "steps": steps_text,
-                "has_warnings": "WARNINGS:" in steps_text or "URGENT" in steps_text.upper(),
-                "needs_emergency": "SEVERE" in severity.upper() if severity else False
-            }
-            
-            return result
-        
-        return {
-            "steps": "Unable to generate first aid instructions. Please consult a healthcare professional.",
-            "has_warnings": True,
-            "needs_emergency": False
-        }
-
+        return _generate_first_aid_steps_improved(injury_description, severity)
     except Exception as e:
         st.error(f"Error generating first aid steps: {e}")
         return {
@@ -208,90 +334,103 @@ def generate_first_aid_steps_improved(injury_description: str, severity: Optiona
         }
 
 
+STREAMING_SYSTEM_PROMPT = """You are a certified first aid instructor. Provide clear, safe first aid instructions.
+        Structure as numbered steps. Always include when to seek professional medical help."""
+
+
+def _streaming_prompt(injury_description: str, severity: Optional[str]) -> list:
+    """Builds the contents for a streamed first aid request."""
+    severity_context = f"Severity: {severity}. " if severity else ""
+    return [STREAMING_SYSTEM_PROMPT, f"{severity_context}Provide first aid steps for: {injury_description}"]
+
+
 def generate_first_aid_steps_streaming(injury_description: str, severity: Optional[str] = None):
     """
     Stream first aid steps as they're generated for better UX.
-    Yields chunks of text as they're generated.
+    Yields text chunks as they arrive - pass straight to st.write_stream(),
+    which renders them incrementally and returns the joined text.
     """
     try:
-        model = genai.GenerativeModel(
-            TEXT_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config={**GENERATION_CONFIG, "max_output_tokens": 2048}
-        )
-
-        system_prompt = """You are a certified first aid instructor. Provide clear, safe first aid instructions.
-        Structure as numbered steps. Always include when to seek professional medical help."""
-        
-        severity_context = f"Severity: {severity}. " if severity else ""
-        user_prompt = f"{severity_context}Provide first aid steps for: {injury_description}"
-
-        # Stream response
-        response = model.generate_content(
-            [system_prompt, user_prompt],
-            stream=True
-        )
-        
-        full_text = ""
+        response = _STREAM_MODEL.generate_content(_streaming_prompt(injury_description, severity), stream=True)
         for chunk in response:
-            if hasattr(chunk, "text"):
-                full_text += chunk.text
+            if chunk.text:
                 yield chunk.text
-        
-        return full_text
 
     except Exception as e:
         yield f"Error: {e}. Please consult a healthcare professional."
 
 
-def assess_emergency_level(injury_description: str) -> str:
+async def generate_first_aid_steps_streaming_async(injury_description: str, severity: Optional[str] = None):
     """
-    Quickly assess if the situation requires immediate emergency attention.
-    Returns: "EMERGENCY", "URGENT", or "ROUTINE"
+    Async variant of generate_first_aid_steps_streaming.
+    Yields text chunks as they arrive without blocking the event loop.
     """
     try:
-        model = genai.GenerativeModel(
-            TEXT_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config={"temperature": 0.2, "max_output_tokens": 50}
+        response = await _STREAM_MODEL.generate_content_async(
+            _streaming_prompt(injury_description, severity),
+            stream=True
         )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
 
-        prompt = f"""Based on this description: "{injury_description}", classify as:
-        - EMERGENCY: Needs immediate 911/emergency services (severe bleeding, unconscious, not breathing)
-        - URGENT: Needs medical attention within hours (broken bones, severe burns, head injury)
-        - ROUTINE: Can wait for medical consultation (minor cuts, bruises, small burns)
-        
-        Respond with only one word: EMERGENCY, URGENT, or ROUTINE"""
-        
-        response = model.generate_content(prompt)
-        if hasattr(response, "text") and response.text:
-            level = response.text.strip().upper()
-            if "EMERGENCY" in level:
-                return "EMERGENCY"
-            elif "URGENT" in level:
-                return "URGENT"
-            else:
-                return "ROUTINE"
-        
-        return "ROUTINE"
-    
     except Exception as e:
-        # Default to ROUTINE on error to avoid false emergencies
-        return "ROUTINE"
+        yield f"Error: {e}. Please consult a healthcare professional."
 
 
-def get_follow_up_questions(injury_description: str) -> list:
+def _emergency_prompt(injury_description: str) -> str:
+    """Builds the emergency classification prompt."""
+    return f"""Based on this description: "{injury_description}", classify as:
+    - EMERGENCY: Needs immediate 911/emergency services (severe bleeding, unconscious, not breathing)
+    - URGENT: Needs medical attention within hours (broken bones, severe burns, head injury)
+    - ROUTINE: Can wait for medical consultation (minor cuts, bruises, small burns)
+    
+    Respond with only one word: EMERGENCY, URGENT, or ROUTINE"""
+
+
+def _parse_emergency_level(response) -> str:
     """
-    Generate relevant follow-up questions to gather more information about the injury.
+    Maps a classifier response onto EMERGENCY, URGENT or ROUTINE. An empty or
+    unrecognized answer fails safe to URGENT.
+    """
+    if hasattr(response, "text") and response.text:
+        level = response.text.strip().upper()
+        if "EMERGENCY" in level:
+            return "EMERGENCY"
+        elif "URGENT" in level:
+            return "URGENT"
+        elif "ROUTINE" in level:
+            return "ROUTINE"
+    
+    return "URGENT"
+
+
+@_exact_cached(TEXT_MODEL, CLASSIFIER_CONFIG)
+def _assess_emergency_level(injury_description: str) -> str:
+    """Classifies the emergency level; errors propagate so they are never cached."""
+    response = _QUICK_MODEL.generate_content(_emergency_prompt(injury_description))
+    return _parse_emergency_level(response)
+
+
+def assess_emergency_level(injury_description: str) -> str:
     """
+    Quickly assess if the situation requires immediate emergency attention.
+    Returns: "EMERGENCY", "URGENT", or "ROUTINE"
+    """
+    level = _keyword_emergency_level(injury_description)
+    if level:
+        return level
+    
     try:
-        model = genai.GenerativeModel(
-            TEXT_MODEL,
-            safety_settings=SAFETY_SETTINGS,
-            generation_config={"temperature": 0.5, "max_output_tokens": 200}
-        )
+        return _assess_emergency_level(injury_description)
+    except Exception as e:
+        # Fail safe: without a classification, advise prompt medical attention
+        return "URGENT"
+
 
-        prompt = f"""Based on this injury description: "{injury_description}", 
+def _follow_up_prompt(injury_description: str) -> str:
+    """Builds the follow-up questions prompt."""
+    return f"""Based on this injury description: "{injury_description}", 
         generate 3-4 relevant follow-up questions that would help assess the situation better.
         Questions should be specific, clear, and help determine severity.
         Format: One question per line, numbered.
@@ -301,18 +440,184 @@ def get_follow_up_questions(injury_description: str) -> list:
         2. Can the person move the affected area?
         3. Are there any signs of shock?
         """
-        
-        response = model.generate_content(prompt)
-        if hasattr(response, "text") and response.text:
-            questions = [q.strip() for q in response.text.split("\n") if q.strip() and q.strip()[0].isdigit()]
-            return questions[:4]  # Limit to 4 questions
-        
+
+
+def _parse_follow_up_questions(response) -> list:
+    """Keeps the numbered lines of a follow-up response, at most four."""
+    if hasattr(response, "text") and response.text:
+        questions = [q.strip() for q in response.text.split("\n") if q.strip() and q.strip()[0].isdigit()]
+        return questions[:4]  # Limit to 4 questions
+    
+    return []
+
+
+def get_follow_up_questions(injury_description: str) -> list:
+    """
+    Generate relevant follow-up questions to gather more information about the injury.
+    """
+    try:
+        response = _FOLLOW_UP_MODEL.generate_content(_follow_up_prompt(injury_description))
+        return _parse_follow_up_questions(response)
+    
+    except Exception as e:
         return []
+
+
+def assess_with_follow_up(injury_description: str) -> Tuple[str, list]:
+    """
+    Runs assess_emergency_level and get_follow_up_questions concurrently
+    (via run_parallel), so the wait is the slower of the two rather than their sum.
+    Returns: (emergency_level, follow_up_questions)
+    """
+    result = run_parallel(injury_description)
+    return result["emergency_level"], result["follow_up"]
+
+
+async def analyze_image_async(uploaded_file) -> Dict[str, Any]:
+    """
+    Async variant of analyze_image_improved.
+    Awaits the network round-trip instead of blocking the script thread.
+    """
+    try:
+        image = _prepare_image(uploaded_file)
+        response = await _VISION_MODEL.generate_content_async(
+            [IMAGE_ANALYSIS_SYSTEM_PROMPT, IMAGE_ANALYSIS_USER_PROMPT, image]
+        )
+        return _parse_image_analysis(response)
+    
+    except Exception as e:
+        return {
+            "analysis": "Unable to analyze the image. Please try again or describe the injury.",
+            "severity": "UNKNOWN",
+            "recommendation": "Please consult a healthcare professional."
+        }
+
+
+async def assess_emergency_level_async(injury_description: str) -> str:
+    """Async variant of assess_emergency_level."""
+    level = _keyword_emergency_level(injury_description)
+    if level:
+        return level
+    
+    try:
+        response = await _QUICK_MODEL.generate_content_async(_emergency_prompt(injury_description))
+        return _parse_emergency_level(response)
+    
+    except Exception as e:
+        # Fail safe: without a classification, advise prompt medical attention
+        return "URGENT"
+
+
+async def get_follow_up_questions_async(injury_description: str) -> list:
+    """Async variant of get_follow_up_questions."""
+    try:
+        response = await _FOLLOW_UP_MODEL.generate_content_async(_follow_up_prompt(injury_description))
+        return _parse_follow_up_questions(response)
     
     except Exception as e:
         return []
 
 
+def run_parallel(injury_desc: str, image=None) -> Dict[str, Any]:
+    """
+    Runs emergency assessment, follow-up questions and (optionally) image analysis
+    concurrently, so the wall-clock cost is the slowest call rather than the sum.
+    Uses worker threads with the script run context rather than asyncio.run: the
+    SDK's async client stays bound to the first event loop it ran on.
+    Returns a dict with emergency_level, follow_up and image_analysis (None without an image).
+    """
+    ctx = get_script_run_ctx()
+    
+    def run(fn, arg):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(arg)
+    
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        level = executor.submit(run, assess_emergency_level, injury_desc)
+        questions = executor.submit(run, get_follow_up_questions, injury_desc)
+        analysis = executor.submit(run, analyze_image_improved, image) if image is not None else None
+        return {
+            "emergency_level": level.result(),
+            "follow_up": questions.result(),
+            "image_analysis": analysis.result() if analysis else None,
+        }
+
+
+_EMERGENCY_LEVELS = ("EMERGENCY", "URGENT", "ROUTINE")
+
+
+def _load_json_report(response) -> Dict[str, Any]:
+    """
+    Parses a JSON-mode response into a dict. Raises ValueError when the response
+    was blocked, cut off at max_output_tokens or is otherwise not a complete object.
+    """
+    candidates = getattr(response, "candidates", None)
+    if candidates and getattr(candidates[0].finish_reason, "name", None) == "MAX_TOKENS":
+        raise ValueError("The response was cut off before it was complete.")
+    try:
+        report = json.loads(response.text)  # .text itself raises ValueError when blocked
+    except json.JSONDecodeError as e:
+        raise ValueError("The response was not a complete JSON report.") from e
+    if not isinstance(report, dict):
+        raise ValueError("The response was not a JSON object.")
+    return report
+
+
+@_exact_cached(VISION_MODEL, REPORT_CONFIG)
+def _analyze_injury_full(uploaded_file_or_desc) -> Dict[str, Any]:
+    """Runs the combined analysis; errors propagate so they are never cached."""
+    system_prompt = """You are a medical first aid assistant. From the injury shown or described, report:
+    - obs: what is visible or described (observations only, NOT a diagnosis)
+    - sev: severity
+    - lvl: EMERGENCY (call emergency services now), URGENT (medical care within hours) or ROUTINE
+    - steps: standard, well-established first aid steps in order, starting with scene safety
+    - warn: important safety warnings
+    - help: when to seek professional medical help
+    - ask: 3-4 short questions that would help assess the situation better
+    """
+
+    if isinstance(uploaded_file_or_desc, str):
+        contents = [system_prompt, f"Injury description: {uploaded_file_or_desc}"]
+    else:
+        contents = [system_prompt, "Analyze this injury image.", _prepare_image(uploaded_file_or_desc)]
+
+    response = _REPORT_MODEL.generate_content(contents)
+    report = {REPORT_KEYS[k]: v for k, v in _load_json_report(response).items() if k in REPORT_KEYS}
+    # A missing or unrecognized level fails safe to URGENT
+    level = str(report.get("emergency_level", "")).upper()
+
+    return {
+        "analysis": report.get("analysis", ""),
+        "severity": str(report.get("severity", "UNKNOWN")).upper(),
+        "emergency_level": level if level in _EMERGENCY_LEVELS else "URGENT",
+        "steps": list(report.get("steps", [])),
+        "warnings": list(report.get("warnings", [])),
+        "when_to_seek_help": report.get("when_to_seek_help", ""),
+        "follow_up": list(report.get("follow_up", []))[:4],
+    }
+
+
+def analyze_injury_full(uploaded_file_or_desc) -> Dict[str, Any]:
+    """
+    Analysis, severity, emergency level, first aid steps, warnings and follow-up
+    questions in a single Gemini call, replacing four separate requests.
+    Accepts an uploaded image or a text description of the injury.
+    """
+    try:
+        return _analyze_injury_full(uploaded_file_or_desc)
+    except Exception as e:
+        st.error(f"Error analyzing injury: {e}")
+        return {
+            "analysis": "Unable to analyze the injury. Please try again or consult a healthcare professional.",
+            "severity": "UNKNOWN",
+            "emergency_level": "URGENT",
+            "steps": [],
+            "warnings": ["Please consult a healthcare professional."],
+            "when_to_seek_help": "",
+            "follow_up": [],
+        }
+
+
 def format_first_aid_response(steps_dict: Dict[str, Any]) -> str:
     """
     Format the structured first aid response for display.
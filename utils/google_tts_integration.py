@@ -7,11 +7,131 @@ Requires Google Cloud TTS API key (optional - falls back to browser TTS if not a
 import streamlit as st
 import requests
 import base64
+import functools
+import hashlib
 import json
-from typing import Optional
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Iterator, Optional
 import io
 
 
+logger = logging.getLogger(__name__)
+
+# Synthesized audio is cached on disk, keyed on voice and text. Files expire
+# after TTS_CACHE_TTL and the oldest are evicted past TTS_CACHE_MAX_BYTES, so
+# announcement text doesn't pile up on the server.
+TTS_CACHE_DIR = "./.tts_cache"
+TTS_CACHE_TTL = 48 * 3600  # seconds
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Pooled keep-alive connection to the TTS API, shared across calls
+_session = requests.Session()
+_session.headers.update({"Content-Type": "application/json"})
+
+# Sentence boundaries used to split text for incremental synthesis
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@functools.lru_cache(maxsize=128)
+def _synthesize(text: str, voice_name: str) -> bytes:
+    """
+    Synthesize one piece of text to MP3 bytes.
+    Hot strings are served from memory, then from TTS_CACHE_DIR, and only then
+    from the API. Errors raise, so they are never cached.
+    """
+    path = os.path.join(TTS_CACHE_DIR, f"{hashlib.sha256((voice_name + text).encode()).hexdigest()}.mp3")
+    try:
+        if time.time() - os.path.getmtime(path) < TTS_CACHE_TTL:
+            with open(path, "rb") as f:
+                return f.read()
+    except OSError:
+        pass  # Not cached (or removed by a concurrent prune)
+    
+    audio = _request_synthesis(text, voice_name)
+    try:
+        # Written to a temp file and renamed into place, so readers never see a partial MP3
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+        _prune_tts_cache()
+    except OSError:
+        pass  # Disk cache is best-effort
+    return audio
+
+
+def _prune_tts_cache():
+    """Removes expired cache files, then the oldest ones until the cache fits TTS_CACHE_MAX_BYTES."""
+    now = time.time()
+    files = []
+    with os.scandir(TTS_CACHE_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".mp3"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime >= TTS_CACHE_TTL:
+                _remove_quietly(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        _remove_quietly(path)
+        total -= size
+
+
+def _remove_quietly(path: str):
+    """Deletes a file, ignoring one that is already gone."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _request_synthesis(text: str, voice_name: str) -> bytes:
+    """Synthesize text to MP3 bytes via the REST API."""
+    api_key = st.secrets["GCP_TTS_API_KEY"]
+    
+    url = f"https://texttospeech.googleapis.com/v1/text:synthesize?key={api_key}"
+    
+    payload = {
+        "input": {"text": text},
+        "voice": {
+            "languageCode": "en-US",
+            "name": voice_name,
+            "ssmlGender": "FEMALE"
+        },
+        "audioConfig": {
+            "audioEncoding": "MP3",
+            "speakingRate": 0.95,
+            "pitch": 0,
+            "volumeGainDb": 0.0
+        }
+    }
+    
+    response = _session.post(url, json=payload, timeout=10)
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"status {response.status_code}")
+    
+    data = response.json()
+    return base64.b64decode(data["audioContent"])
+
+
 def speak_with_google_tts(text: str, voice_name: str = "en-US-Neural2-F", use_api: bool = False) -> Optional[bytes]:
     """
     Use Google Cloud Text-to-Speech API for premium neural voices.
@@ -29,47 +149,42 @@ def speak_with_google_tts(text: str, voice_name: str = "en-US-Neural2-F", use_ap
         return None
     
     try:
-        api_key = st.secrets["GCP_TTS_API_KEY"]
-        
-        url = f"https://texttospeech.googleapis.com/v1/text:synthesize?key={api_key}"
-        
-        payload = {
-            "input": {"text": text},
-            "voice": {
-                "languageCode": "en-US",
-                "name": voice_name,
-                "ssmlGender": "FEMALE"
-            },
-            "audioConfig": {
-                "audioEncoding": "MP3",
-                "speakingRate": 0.95,
-                "pitch": 0,
-                "volumeGainDb": 0.0
-            }
-        }
-        
-        response = requests.post(url, json=payload, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            audio_content = base64.b64decode(data["audioContent"])
-            return audio_content
-        else:
-            st.debug(f"Google TTS API error: {response.status_code}")
-            return None
+        return _synthesize(text, voice_name)
     
     except Exception as e:
-        st.debug(f"Google TTS API error: {e}")
+        logger.debug(f"Google TTS API error: {e}")
         return None
 
 
+def stream_google_tts(text: str, voice_name: str = "en-US-Neural2-F", use_api: bool = False) -> Iterator[bytes]:
+    """
+    Synthesize text sentence by sentence, yielding MP3 bytes as each one arrives.
+    Playback can start after the first sentence instead of after the whole text;
+    MP3 frames concatenate, so the chunks can be appended to one buffer.
+    Yields nothing if the API is unavailable (callers fall back to browser TTS).
+    """
+    if not use_api or "GCP_TTS_API_KEY" not in st.secrets:
+        return
+    
+    try:
+        for sentence in _SENTENCE_END_RE.split(text.strip()):
+            if sentence:
+                yield _synthesize(sentence, voice_name)
+    
+    except Exception as e:
+        logger.debug(f"Google TTS API error: {e}")
+
+
+# Premium Google TTS voices (neural voices similar to Siri/Gemini)
+_PREMIUM_VOICES = {
+    "female_natural": "en-US-Neural2-F",  # Most natural, Siri-like
+    "male_natural": "en-US-Neural2-D",
+    "female_gentle": "en-US-Neural2-J",
+    "female_warm": "en-US-Standard-E",
+    "female_clear": "en-US-Wavenet-F",
+}
+
+
 def get_premium_voice_names() -> dict:
     """Get list of premium Google TTS voices (neural voices similar to Siri/Gemini)."""
-    return {
-        "female_natural": "en-US-Neural2-F",  # Most natural, Siri-like
-        "male_natural": "en-US-Neural2-D",
-        "female_gentle": "en-US-Neural2-J",
-        "female_warm": "en-US-Standard-E",
-        "female_clear": "en-US-Wavenet-F",
-    }
-
+    return _PREMIUM_VOICES
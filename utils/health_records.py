@@ -6,20 +6,104 @@ Manages user injury records, first aid steps, recovery tracking, and medical his
 import streamlit as st
 import json
 import uuid
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from PIL import Image
-import io
 import base64
+import io
+from bisect import bisect_left, bisect_right
+
+
+# Photos are kept in session state as downscaled JPEG bytes, never on the server disk
+PHOTO_MAX_DIMENSION = 1600
+PHOTO_JPEG_QUALITY = 85
 
 
 # Initialize health records in session state
 def init_health_records():
-    """Initialize health records storage in session state."""
+    """Initialize health records storage and its lookup indexes in session state."""
     if 'health_records' not in st.session_state:
         st.session_state.health_records = []
     if 'current_record_id' not in st.session_state:
         st.session_state.current_record_id = None
+    if '_by_id' not in st.session_state:
+        _rebuild_indexes()
+    if '_records_version' not in st.session_state:
+        st.session_state._records_version = 0
+
+
+# Secondary indexes over st.session_state.health_records, kept in step by
+# save_record/delete_record:
+#   _by_id       id -> record
+#   _by_severity severity -> set of ids
+#   _by_status   status -> set of ids
+#   _by_bodypart lowercased body part -> set of ids
+#   _ts_keys / _ts_ids  parallel lists sorted by parsed timestamp
+#   _indexed     id -> (severity, status, body_part, timestamp) as last indexed,
+#                since records are mutated in place before being saved
+def _rebuild_indexes():
+    """Rebuild every index from the records list."""
+    st.session_state._by_id = {}
+    st.session_state._by_severity = {}
+    st.session_state._by_status = {}
+    st.session_state._by_bodypart = {}
+    st.session_state._ts_keys = []
+    st.session_state._ts_ids = []
+    st.session_state._indexed = {}
+    for record in st.session_state.health_records:
+        _index_record(record)
+
+
+def _parse_timestamp(record: Dict[str, Any]) -> datetime:
+    """Return a record's timestamp, parsed at creation when possible; unparseable ones sort first."""
+    if "_ts" in record:
+        return record["_ts"]
+    try:
+        return datetime.fromisoformat(record.get("timestamp", ""))
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+def _index_record(record: Dict[str, Any]):
+    """Add a record to every index."""
+    record_id = record.get("id")
+    keys = (
+        record.get("severity"),
+        record.get("status"),
+        (record.get("body_part") or "").lower(),
+        _parse_timestamp(record)
+    )
+    severity, status, body_part, ts = keys
+    
+    st.session_state._by_id[record_id] = record
+    st.session_state._by_severity.setdefault(severity, set()).add(record_id)
+    st.session_state._by_status.setdefault(status, set()).add(record_id)
+    st.session_state._by_bodypart.setdefault(body_part, set()).add(record_id)
+    
+    pos = bisect_right(st.session_state._ts_keys, ts)
+    st.session_state._ts_keys.insert(pos, ts)
+    st.session_state._ts_ids.insert(pos, record_id)
+    st.session_state._indexed[record_id] = keys
+
+
+def _unindex_record(record_id: str):
+    """Remove a record from every index, using the keys it was indexed under."""
+    keys = st.session_state._indexed.pop(record_id, None)
+    if keys is None:
+        return
+    severity, status, body_part, ts = keys
+    
+    st.session_state._by_id.pop(record_id, None)
+    st.session_state._by_severity.get(severity, set()).discard(record_id)
+    st.session_state._by_status.get(status, set()).discard(record_id)
+    st.session_state._by_bodypart.get(body_part, set()).discard(record_id)
+    
+    pos = bisect_left(st.session_state._ts_keys, ts)
+    while st.session_state._ts_ids[pos] != record_id:
+        pos += 1
+    del st.session_state._ts_keys[pos]
+    del st.session_state._ts_ids[pos]
 
 
 def create_injury_record(
@@ -43,14 +127,16 @@ def create_injury_record(
         first_aid_steps: Recommended first aid steps
         body_part: Body part affected
         location: Location where injury occurred
-        images: List of uploaded images
+        images: List of uploaded images or decoded PIL images
     
     Returns:
         Dict containing the injury record
     """
+    now = datetime.now()
     record = {
         "id": str(uuid.uuid4()),
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": now.isoformat(),
+        "_ts": now,  # Parsed timestamp; underscore keys are dropped on export
         "injury_type": injury_description,
         "description": injury_description,
         "severity": severity,
@@ -91,10 +177,18 @@ def create_injury_record(
         }
     }
     
-    # Add initial photo if provided
+    # Add initial photo if provided; the record is not saved yet, so attach directly.
+    # PIL images are passed through as image_obj to skip a second decode.
     if images:
         for img in images:
-            add_photo_to_record(record["id"], img, "before")
+            try:
+                if isinstance(img, Image.Image):
+                    entry = _store_photo(None, "before", image_obj=img)
+                else:
+                    entry = _store_photo(img, "before")
+                record["photos"]["before"].append(entry)
+            except Exception as e:
+                st.error(f"Error adding photo: {e}")
     
     return record
 
@@ -102,48 +196,54 @@ def create_injury_record(
 def save_record(record: Dict[str, Any]) -> bool:
     """Save a record to session state."""
     init_health_records()
+    record_id = record.get("id")
+    existing = st.session_state._by_id.get(record_id)
     
-    # Check if record already exists (update) or is new (add)
-    existing_index = None
-    for idx, r in enumerate(st.session_state.health_records):
-        if r.get("id") == record.get("id"):
-            existing_index = idx
-            break
-    
-    if existing_index is not None:
-        # Update existing record
-        st.session_state.health_records[existing_index] = record
+    if existing is not None:
+        # Update existing record (usually the same object, mutated in place)
+        if existing is not record:
+            records = st.session_state.health_records
+            records[records.index(existing)] = record
+        _unindex_record(record_id)
     else:
         # Add new record
         st.session_state.health_records.append(record)
     
+    _index_record(record)
+    st.session_state._records_version += 1
     return True
 
 
 def get_record(record_id: str) -> Optional[Dict[str, Any]]:
     """Get a specific record by ID."""
     init_health_records()
-    for record in st.session_state.health_records:
-        if record.get("id") == record_id:
-            return record
-    return None
+    return st.session_state._by_id.get(record_id)
+
+
+def _iter_all_records():
+    """Yield every record in storage order, without copying or sorting."""
+    init_health_records()
+    yield from st.session_state.health_records
 
 
 def get_all_records(sort_by: str = "timestamp", reverse: bool = True) -> List[Dict[str, Any]]:
     """Get all records, sorted by specified field."""
     init_health_records()
-    records = st.session_state.health_records.copy()
+    records = st.session_state.health_records
     
     if sort_by == "timestamp":
-        records.sort(key=lambda x: x.get("timestamp", ""), reverse=reverse)
+        # Already ordered by the timestamp index
+        by_id = st.session_state._by_id
+        ts_ids = reversed(st.session_state._ts_ids) if reverse else st.session_state._ts_ids
+        return [by_id[record_id] for record_id in ts_ids]
     elif sort_by == "severity":
         severity_order = {"SEVERE": 3, "MODERATE": 2, "MINOR": 1, "UNKNOWN": 0}
-        records.sort(key=lambda x: severity_order.get(x.get("severity", "UNKNOWN"), 0), reverse=reverse)
+        return sorted(records, key=lambda x: severity_order.get(x.get("severity", "UNKNOWN"), 0), reverse=reverse)
     elif sort_by == "status":
         status_order = {"active": 3, "healing": 2, "healed": 1, "archived": 0}
-        records.sort(key=lambda x: status_order.get(x.get("status", "active"), 0), reverse=reverse)
+        return sorted(records, key=lambda x: status_order.get(x.get("status", "active"), 0), reverse=reverse)
     
-    return records
+    return list(records)
 
 
 def filter_records(
@@ -154,33 +254,71 @@ def filter_records(
     date_to: Optional[datetime] = None,
     search_query: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    """Filter records based on criteria."""
-    records = get_all_records()
-    filtered = records
-    
-    if severity:
-        filtered = [r for r in filtered if r.get("severity") == severity]
-    if status:
-        filtered = [r for r in filtered if r.get("status") == status]
-    if body_part:
-        filtered = [r for r in filtered if r.get("body_part", "").lower() == body_part.lower()]
-    if date_from:
-        filtered = [r for r in filtered if datetime.fromisoformat(r.get("timestamp", "")) >= date_from]
-    if date_to:
-        filtered = [r for r in filtered if datetime.fromisoformat(r.get("timestamp", "")) <= date_to]
-    if search_query:
-        query_lower = search_query.lower()
-        filtered = [
-            r for r in filtered
-            if query_lower in r.get("injury_type", "").lower()
-            or query_lower in r.get("description", "").lower()
-            or query_lower in r.get("body_part", "").lower()
-        ]
-    
-    return filtered
-
-
-def add_photo_to_record(record_id: str, image: Any, photo_type: str = "before") -> bool:
+    """
+    Filter records based on criteria, newest first.
+    Field filters intersect the index sets; date ranges bisect the sorted timestamps.
+    """
+    init_health_records()
+    ts_keys = st.session_state._ts_keys
+    lo = bisect_left(ts_keys, date_from) if date_from else 0
+    hi = bisect_right(ts_keys, date_to) if date_to else len(ts_keys)
+    
+    candidates = None
+    for index, key in (
+        (st.session_state._by_severity, severity),
+        (st.session_state._by_status, status),
+        (st.session_state._by_bodypart, body_part.lower() if body_part else None),
+    ):
+        if key:
+            ids = index.get(key, set())
+            candidates = ids if candidates is None else candidates & ids
+    
+    by_id = st.session_state._by_id
+    ts_ids = st.session_state._ts_ids
+    query_lower = search_query.lower() if search_query else None
+    
+    def _iter():
+        # One pass over the date window, newest first; no intermediate lists or sort
+        for i in range(hi - 1, lo - 1, -1):
+            record_id = ts_ids[i]
+            if candidates is not None and record_id not in candidates:
+                continue
+            record = by_id[record_id]
+            if query_lower and not (
+                query_lower in (record.get("injury_type") or "").lower()
+                or query_lower in (record.get("description") or "").lower()
+                or query_lower in (record.get("body_part") or "").lower()
+            ):
+                continue
+            yield record
+    
+    return list(_iter())
+
+
+def _store_photo(image: Any, photo_type: str, image_obj: Optional[Image.Image] = None) -> Dict[str, Any]:
+    """Encode a downscaled JPEG and return the photo entry holding its bytes."""
+    # A caller-decoded image is copied, not reopened, so its pixels are left untouched
+    img = image_obj.copy() if image_obj is not None else Image.open(image)
+    img.thumbnail((PHOTO_MAX_DIMENSION, PHOTO_MAX_DIMENSION))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=PHOTO_JPEG_QUALITY, optimize=True)
+    
+    return {
+        "data": buffer.getvalue(),
+        "timestamp": datetime.now().isoformat(),
+        "type": photo_type
+    }
+
+
+def add_photo_to_record(
+    record_id: str,
+    image: Any = None,
+    photo_type: str = "before",
+    image_obj: Optional[Image.Image] = None
+) -> bool:
     """
     Add a photo to a record.
     
@@ -188,23 +326,15 @@ def add_photo_to_record(record_id: str, image: Any, photo_type: str = "before")
         record_id: ID of the record
         image: Uploaded image file
         photo_type: "before", "during", or "after"
+        image_obj: Already-decoded PIL image, used instead of reopening image
     """
     record = get_record(record_id)
     if not record:
         return False
     
-    # Convert image to base64 for storage
+    # Only the compressed JPEG is kept in session state
     try:
-        img = Image.open(image)
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        photo_entry = {
-            "data": img_str,
-            "timestamp": datetime.now().isoformat(),
-            "type": photo_type
-        }
+        photo_entry = _store_photo(image, photo_type, image_obj)
         
         if photo_type in record["photos"]:
             record["photos"][photo_type].append(photo_entry)
@@ -216,6 +346,11 @@ def add_photo_to_record(record_id: str, image: Any, photo_type: str = "before")
         return False
 
 
+def get_photo_bytes(entry: Dict[str, Any]) -> Optional[bytes]:
+    """Return a stored photo's JPEG bytes."""
+    return entry.get("data")
+
+
 def update_recovery_progress(
     record_id: str,
     progress_percentage: int,
@@ -320,8 +455,24 @@ def add_medication(
 
 
 def get_statistics() -> Dict[str, Any]:
-    """Get statistics about health records."""
-    records = get_all_records()
+    """
+    Get statistics about health records.
+    Memoized per session on _records_version, which every save/delete bumps,
+    so reruns without changes reuse the last result.
+    """
+    init_health_records()
+    cached = st.session_state.get('_stats_cache')
+    if cached and cached[0] == st.session_state._records_version:
+        return cached[1]
+    
+    stats = _compute_statistics()
+    st.session_state._stats_cache = (st.session_state._records_version, stats)
+    return stats
+
+
+def _compute_statistics() -> Dict[str, Any]:
+    """Compute statistics over all records (order does not matter, so no sort)."""
+    records = st.session_state.health_records
     
     if not records:
         return {
@@ -332,56 +483,58 @@ def get_statistics() -> Dict[str, Any]:
             "average_recovery_time": None
         }
     
-    # Count by severity
-    severity_count = {}
-    for record in records:
-        sev = record.get("severity", "UNKNOWN")
-        severity_count[sev] = severity_count.get(sev, 0) + 1
-    
-    # Count by status
-    status_count = {}
-    for record in records:
-        status = record.get("status", "active")
-        status_count[status] = status_count.get(status, 0) + 1
-    
-    # Most common body part
-    body_parts = {}
-    for record in records:
+    # Count severity, status and body part in a single pass
+    severity_count = Counter()
+    status_count = Counter()
+    body_parts = Counter()
+    for record in _iter_all_records():
+        severity_count[record.get("severity", "UNKNOWN")] += 1
+        status_count[record.get("status", "active")] += 1
         bp = record.get("body_part")
         if bp:
-            body_parts[bp] = body_parts.get(bp, 0) + 1
+            body_parts[bp] += 1
     
-    most_common_body_part = max(body_parts.items(), key=lambda x: x[1])[0] if body_parts else None
+    most_common = body_parts.most_common(1)
     
     return {
         "total_records": len(records),
-        "by_severity": severity_count,
-        "by_status": status_count,
-        "most_common_body_part": most_common_body_part,
-        "active_injuries": len([r for r in records if r.get("status") == "active"]),
-        "healed_injuries": len([r for r in records if r.get("status") == "healed"])
+        "by_severity": dict(severity_count),
+        "by_status": dict(status_count),
+        "most_common_body_part": most_common[0][0] if most_common else None,
+        "active_injuries": status_count["active"],
+        "healed_injuries": status_count["healed"]
     }
 
 
 def export_record_to_dict(record_id: str) -> Optional[Dict[str, Any]]:
     """Export a record as a dictionary (for JSON export)."""
-    return get_record(record_id)
+    record = get_record(record_id)
+    if record is None:
+        return None
+    exported = {k: v for k, v in record.items() if not k.startswith("_")}
+    # JPEG bytes are base64-encoded so the export stays JSON-serializable
+    exported["photos"] = {
+        photo_type: [{**entry, "data": base64.b64encode(entry["data"]).decode()} for entry in entries]
+        for photo_type, entries in record.get("photos", {}).items()
+    }
+    return exported
 
 
 def delete_record(record_id: str) -> bool:
-    """Delete a record."""
+    """Delete a record, including its photos."""
     init_health_records()
-    st.session_state.health_records = [
-        r for r in st.session_state.health_records
-        if r.get("id") != record_id
-    ]
+    record = get_record(record_id)
+    if record:
+        st.session_state.health_records.remove(record)
+        _unindex_record(record_id)
+        st.session_state._records_version += 1
     return True
 
 
 def format_record_date(record: Dict[str, Any]) -> str:
     """Format record timestamp for display."""
     try:
-        dt = datetime.fromisoformat(record.get("timestamp", ""))
+        dt = record.get("_ts") or datetime.fromisoformat(record.get("timestamp", ""))
         return dt.strftime("%B %d, %Y at %I:%M %p")
     except:
         return "Unknown date"
@@ -390,9 +543,8 @@ def format_record_date(record: Dict[str, Any]) -> str:
 def get_record_age_days(record: Dict[str, Any]) -> int:
     """Get the age of a record in days."""
     try:
-        dt = datetime.fromisoformat(record.get("timestamp", ""))
-        delta = datetime.now() - dt
-        return delta.days
+        dt = record.get("_ts") or datetime.fromisoformat(record.get("timestamp", ""))
+        return (datetime.now() - dt).days
     except:
         return 0
 
@@ -1,14 +1,87 @@
 import streamlit as st
 import google.generativeai as genai
 import pandas as pd
+import numpy as np
+import json
+import logging
+import math
+import os
 import re
 import requests
-from typing import Tuple, Optional
+import shelve
+import threading
+import time
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Tuple, Optional
 from streamlit_js_eval import streamlit_js_eval
 import folium
 from streamlit_folium import folium_static
 
 
+logger = logging.getLogger(__name__)
+
+# Pooled keep-alive session for Nominatim
+_HTTP = requests.Session()
+_HTTP.headers["User-Agent"] = "FirstAid-AI-Agent/1.0"  # Required by Nominatim
+
+# Persistent Nominatim cache: forward keys are normalized addresses, reverse keys
+# are coordinates rounded to ~100 m. Entries are (timestamp, value) tuples.
+GEOCODE_CACHE_PATH = os.path.expanduser("~/.cache/firstaid_geocode")
+GEOCODE_CACHE_TTL = 48 * 3600  # seconds
+NOMINATIM_MIN_INTERVAL = 1.0  # Seconds between requests, per Nominatim's usage policy
+GEOCODE_HINT_DEGREES = 0.5  # Half-width of the viewbox around a location hint
+_geocode_memory = {}
+_geocode_lock = threading.Lock()
+_nominatim_lock = threading.Lock()
+_nominatim_last = 0.0
+_MISS = object()
+
+
+def _geocode_cache_get(key: str) -> Any:
+    """Returns a fresh cached value (which may be None for "not found"), or _MISS."""
+    with _geocode_lock:
+        entry = _geocode_memory.get(key)
+        if entry is None:
+            try:
+                with shelve.open(GEOCODE_CACHE_PATH) as db:
+                    entry = db.get(key)
+            except Exception:
+                entry = None
+            if entry is not None:
+                _geocode_memory[key] = entry
+    
+    if entry is not None and time.time() - entry[0] < GEOCODE_CACHE_TTL:
+        return entry[1]
+    return _MISS
+
+
+def _geocode_cache_set(key: str, value: Any):
+    """Stores a value in memory and on disk."""
+    entry = (time.time(), value)
+    with _geocode_lock:
+        _geocode_memory[key] = entry
+        try:
+            os.makedirs(os.path.dirname(GEOCODE_CACHE_PATH), exist_ok=True)
+            with shelve.open(GEOCODE_CACHE_PATH) as db:
+                db[key] = entry
+        except Exception:
+            pass  # Disk cache is best-effort
+
+
+def _nominatim_get(url: str, params: dict) -> requests.Response:
+    """
+    GET from Nominatim, spaced at least NOMINATIM_MIN_INTERVAL apart across
+    all sessions in this process so the server never sees more than 1 req/s.
+    """
+    global _nominatim_last
+    with _nominatim_lock:
+        wait = _nominatim_last + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _nominatim_last = time.monotonic()
+    return _HTTP.get(url, params=params, timeout=5)
+
 
 def request_location_permission():
     """
@@ -33,34 +106,47 @@ def request_location_permission():
         st.info("Waiting for location permission...")
         return None
 
-def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+def geocode_address(address: str, hint: Optional[Tuple[float, float]] = None) -> Optional[Tuple[float, float]]:
     """
     Geocodes an address to get latitude and longitude using Nominatim (OpenStreetMap).
-    Free service, no API key required.
+    Free service, no API key required. Results are cached for GEOCODE_CACHE_TTL.
+    With a (lat, lon) hint the search is bounded to a box of GEOCODE_HINT_DEGREES
+    around it, which is faster server-side and avoids same-name matches elsewhere.
     """
+    key = f"fwd:{address.strip().lower()}"
+    if hint:
+        key += f"@{hint[0]:.1f},{hint[1]:.1f}"
+    cached = _geocode_cache_get(key)
+    if cached is not _MISS:
+        return cached
+    
     try:
         url = "https://nominatim.openstreetmap.org/search"
         params = {
             "q": address,
             "format": "json",
-            "limit": 1
+            "limit": 1,
+            "addressdetails": 0
         }
-        headers = {
-            "User-Agent": "FirstAid-AI-Agent/1.0"  # Required by Nominatim
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=5)
+        if hint:
+            lat0, lon0 = hint
+            d = GEOCODE_HINT_DEGREES
+            params.update({"viewbox": f"{lon0 - d},{lat0 + d},{lon0 + d},{lat0 - d}", "bounded": 1})
+        response = _nominatim_get(url, params)
         if response.status_code == 200:
             data = response.json()
+            coords = None
             if data and len(data) > 0:
-                lat = float(data[0]["lat"])
-                lon = float(data[0]["lon"])
-                return (lat, lon)
+                coords = (float(data[0]["lat"]), float(data[0]["lon"]))
+            _geocode_cache_set(key, coords)
+            return coords
         return None
     except Exception as e:
-        st.debug(f"Geocoding error for {address}: {e}")
+        logger.debug(f"Geocoding error for {address}: {e}")
         return None
 
 
+@lru_cache(maxsize=256)
 def get_navigation_url(lat: float, lon: float, name: str = None) -> str:
     """
     Generates a navigation URL that opens the device's default map application.
@@ -74,20 +160,23 @@ def get_navigation_url(lat: float, lon: float, name: str = None) -> str:
     """
     # Google Maps Directions URL - works across platforms and opens native app if installed
     # Using 'dir' parameter for turn-by-turn navigation with destination
-    if name:
-        # URL encode the name for better compatibility
-        import urllib.parse
-        encoded_name = urllib.parse.quote(name)
-        return f"https://www.google.com/maps/dir/?api=1&destination={lat},{lon}&destination_place_id=&q={encoded_name}"
-    else:
-        return f"https://www.google.com/maps/dir/?api=1&destination={lat},{lon}"
+    base = f"https://www.google.com/maps/dir/?api=1&destination={lat},{lon}"
+    # URL encode the name for better compatibility
+    return f"{base}&destination_place_id=&q={urllib.parse.quote(name)}" if name else base
 
 
 def reverse_geocode(lat: float, lon: float) -> Optional[str]:
     """
     Reverse geocodes coordinates to get an address using Nominatim (OpenStreetMap).
-    Free service, no API key required.
+    Free service, no API key required. Coordinates are rounded to ~100 m so that
+    GPS jitter shares one cache entry and one upstream request.
     """
+    lat, lon = round(lat, 3), round(lon, 3)
+    key = f"rev:{lat:.3f},{lon:.3f}"
+    cached = _geocode_cache_get(key)
+    if cached is not _MISS:
+        return cached
+    
     try:
         url = "https://nominatim.openstreetmap.org/reverse"
         params = {
@@ -95,54 +184,196 @@ def reverse_geocode(lat: float, lon: float) -> Optional[str]:
             "lon": lon,
             "format": "json"
         }
-        headers = {
-            "User-Agent": "FirstAid-AI-Agent/1.0"  # Required by Nominatim
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=5)
+        response = _nominatim_get(url, params)
         if response.status_code == 200:
             data = response.json()
-            if data and "display_name" in data:
-                return data["display_name"]
+            address = data.get("display_name") if data else None
+            _geocode_cache_set(key, address)
+            return address
         return None
     except Exception as e:
-        st.debug(f"Reverse geocoding error for ({lat}, {lon}): {e}")
+        logger.debug(f"Reverse geocoding error for ({lat}, {lon}): {e}")
         return None
 
 
-def find_nearby_facilities_by_coords(lat: float, lon: float, radius_km: float = 10.0) -> str:
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OVERPASS_MAX_RESULTS = 5
+
+
+def _osm_address(tags: dict) -> str:
+    """Builds a display address from OSM addr:* tags."""
+    if tags.get("addr:full"):
+        return tags["addr:full"]
+    street = " ".join(filter(None, (tags.get("addr:housenumber"), tags.get("addr:street"))))
+    return ", ".join(filter(None, (street, tags.get("addr:city"), tags.get("addr:state"))))
+
+
+def overpass_hospitals(lat: float, lon: float, radius_m: int = 10000) -> list:
     """
-    Finds nearby healthcare facilities using coordinates and Gemini AI.
-    Uses the user's exact location to find the closest hospitals.
+    Looks up hospitals around a point in OpenStreetMap via the Overpass API.
+    Returns the nearest OVERPASS_MAX_RESULTS as dicts with name, address, lat
+    and lon (the same shape as a Gemini facility search). Results are cached
+    like geocodes; errors propagate so they are never cached.
     """
+    lat, lon = round(lat, 3), round(lon, 3)
+    key = f"osm:{lat:.3f},{lon:.3f},{radius_m}"
+    cached = _geocode_cache_get(key)
+    if cached is not _MISS:
+        return cached
+    
+    around = f"(around:{radius_m},{lat},{lon})"
+    query = f"[out:json][timeout:5];(node[amenity=hospital]{around};way[amenity=hospital]{around};);out center tags;"
+    response = _HTTP.post(OVERPASS_URL, data={"data": query}, timeout=5)
+    response.raise_for_status()
+    
+    hospitals = []
+    for element in response.json().get("elements", []):
+        tags = element.get("tags", {})
+        point = element if "lat" in element else element.get("center")
+        if not point:
+            continue
+        hospitals.append({
+            "name": tags.get("name", "Hospital"),
+            "address": _osm_address(tags),
+            "lat": float(point["lat"]),
+            "lon": float(point["lon"]),
+        })
+    
+    # Nearest first (equirectangular distance is plenty for ranking within a city)
+    scale = math.cos(math.radians(lat))
+    hospitals.sort(key=lambda h: (h["lat"] - lat) ** 2 + ((h["lon"] - lon) * scale) ** 2)
+    hospitals = hospitals[:OVERPASS_MAX_RESULTS]
+    _geocode_cache_set(key, hospitals)
+    return hospitals
+
+
+@st.cache_resource
+def _get_gemini_model():
+    """Configures the Gemini API once and returns the model shared by facility searches."""
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    # The grounded (Google search) mode would be enabled here:
+    # generation_config={"mode": "google_search_retrieval"}
+    return genai.GenerativeModel("gemini-2.5-flash")
+
+
+# Facility searches return a JSON array. Coordinates are optional so the model
+# can leave them out rather than guess; missing ones are geocoded.
+FACILITIES_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "address": {"type": "string"},
+                "lat": {"type": "number"},
+                "lon": {"type": "number"},
+            },
+            "required": ["name", "address"],
+        },
+    },
+}
+
+
+# Facility search responses, shared across sessions for an hour.
+# Hand-rolled rather than st.cache_data because the generation streams into
+# a placeholder, and cached st element calls would be replayed on every hit.
+FACILITY_CACHE_TTL = 3600  # seconds
+
+# Hospital names already complete in a partially streamed JSON array
+_STREAM_NAME_RE = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# Guards _facility_cache(), which every session thread shares
+_facility_lock = threading.Lock()
+
+
+@st.cache_resource
+def _facility_cache() -> dict:
+    """Returns the process-wide (system_prompt, user_prompt) -> (timestamp, text) cache."""
+    return {}
+
+
+def _generate_facilities(system_prompt: str, user_prompt: str) -> Optional[str]:
+    """
+    Runs a facility search prompt, cached for an hour on the prompt text.
+    On a miss the response is streamed, and hospital names are shown in a
+    placeholder as soon as they are generated; the placeholder is cleared once
+    the full text is returned. Errors propagate so they are never cached.
+    """
+    cache = _facility_cache()
+    key = (system_prompt, user_prompt)
+    with _facility_lock:
+        entry = cache.get(key)
+    if entry and time.time() - entry[0] < FACILITY_CACHE_TTL:
+        return entry[1]
+    
+    stream = _get_gemini_model().generate_content(
+        [system_prompt, user_prompt],
+        generation_config=FACILITIES_CONFIG,
+        stream=True
+    )
+    placeholder = st.empty()
+    buf = []
     try:
-        # 1. Configure Gemini API
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+        for chunk in stream:
+            # Finish-only or safety chunks carry no parts, and .text raises on them
+            if not chunk.parts:
+                continue
+            buf.append(chunk.text)
+            found = _STREAM_NAME_RE.findall("".join(buf))
+            if found:
+                placeholder.markdown("\n".join(f"{i}. **{name}**" for i, name in enumerate(found, 1)))
+    finally:
+        placeholder.empty()
+    
+    text = "".join(buf).strip()
+    if not text:
+        return None
+    
+    now = time.time()
+    with _facility_lock:
+        for stale in [k for k, (ts, _) in cache.items() if now - ts >= FACILITY_CACHE_TTL]:
+            del cache[stale]
+        cache[key] = (now, text)
+    return text
 
-        # 2. Use the grounded (Google search) mode
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            # generation_config={"mode": "google_search_retrieval"}
-        )
 
-        # 3. Build prompts - request structured format with coordinates
+def find_nearby_facilities_by_coords(lat: float, lon: float, radius_km: float = 10.0) -> str:
+    """
+    Finds nearby healthcare facilities using coordinates.
+    OpenStreetMap (Overpass) is queried first since it returns exact
+    coordinates in one request; Gemini AI is the fallback when it finds
+    nothing or is unavailable. The user's location is rounded to ~100 m so
+    nearby repeat searches share a cached answer.
+    """
+    lat_q, lon_q = round(lat, 3), round(lon, 3)
+    try:
+        hospitals = overpass_hospitals(lat_q, lon_q, int(radius_km * 1000))
+        if hospitals:
+            return json.dumps(hospitals)
+    except Exception as e:
+        logger.debug(f"Overpass search error for ({lat_q}, {lon_q}): {e}")
+    
+    try:
+        # 1. Build prompts - request structured format with coordinates
         system_prompt = (
             "You are a helpful emergency assistant. "
             "Find the top 3-5 nearest public or general hospitals near the given coordinates. "
-            "For each hospital, provide: Name, Full Address, and if possible Latitude and Longitude coordinates. "
-            "Format each result on a new line starting with a number, followed by the hospital name, address, and coordinates if available."
+            "For each hospital, provide: Name, Full Address, and if known Latitude and Longitude coordinates."
         )
 
         user_prompt = (
-            f"Find hospitals near latitude {lat}, longitude {lon} within {radius_km} km radius. "
-            "Format as: Number. Hospital Name | Address | Latitude, Longitude (if available)"
+            f"Find hospitals near latitude {lat_q}, longitude {lon_q} within {radius_km} km radius. "
+            "Return a JSON array of hospitals with name, address, lat and lon."
         )
 
-        # 4. Generate response
-        response = model.generate_content([system_prompt, user_prompt])
+        # 2. Generate (or reuse a cached) response
+        result = _generate_facilities(system_prompt, user_prompt)
 
-        # 5. Return formatted text
-        if response and hasattr(response, "text") and response.text:
-            return response.text.strip()
+        # 3. Return formatted text
+        if result:
+            return result
         else:
             return "⚠️ No hospitals found near your location. Try another location."
 
@@ -157,34 +388,24 @@ def find_nearby_facilities(location_query: str):
     based on a text-based location query (e.g., "Austin, TX").
     """
     try:
-        # 1. Configure Gemini API
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-
-        # 2. Use the grounded (Google search) mode
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            # generation_config={"mode": "google_search_retrieval"}
-        )
-
-        # 3. Build prompts - request structured format with coordinates
+        # 1. Build prompts - request structured format with coordinates
         system_prompt = (
             "You are a helpful emergency assistant. "
             "Find the top 3-5 nearest public or general hospitals near the user's requested location. "
-            "For each hospital, provide: Name, Full Address, and if possible Latitude and Longitude coordinates. "
-            "Format each result on a new line starting with a number, followed by the hospital name, address, and coordinates if available."
+            "For each hospital, provide: Name, Full Address, and if known Latitude and Longitude coordinates."
         )
 
         user_prompt = (
             f"Find hospitals near: {location_query}. "
-            "Format as: Number. Hospital Name | Address | Latitude, Longitude (if available)"
+            "Return a JSON array of hospitals with name, address, lat and lon."
         )
 
-        # 4. Generate response
-        response = model.generate_content([system_prompt, user_prompt])
+        # 2. Generate (or reuse a cached) response
+        result = _generate_facilities(system_prompt, user_prompt)
 
-        # 5. Return formatted text
-        if response and hasattr(response, "text") and response.text:
-            return response.text.strip()
+        # 3. Return formatted text
+        if result:
+            return result
         else:
             return "⚠️ No hospitals found. Try another location."
 
@@ -193,107 +414,194 @@ def find_nearby_facilities(location_query: str):
         return "⚠️ Could not search for hospitals. Please check your Gemini API key and network connection."
 
 
-def parse_facilities_to_df(text_result: str) -> pd.DataFrame:
+# Facility list line patterns, compiled once. _COMBINED strips the list number;
+# _BODY_PIPE splits "Name | Address [| Lat, Lon]" so names and addresses may
+# contain hyphens and commas, and _BODY_WITH_COORDS is the fallback for other
+# bodies, where <delim> is any of | , - – —. Coordinates may be in parens.
+_COMBINED = re.compile(r'^\d+\.\s*(?P<body>.+)$')
+_BODY_PIPE = re.compile(
+    r'^(?P<name>[^|]+?)\s*\|\s*(?P<addr>[^|]+?)'
+    r'(?:\s*\|\s*\(?(?P<lat>[+-]?\d+\.?\d*)\s*,\s*(?P<lon>[+-]?\d+\.?\d*)\)?)?\s*$'
+)
+_BODY_WITH_COORDS = re.compile(
+    r'^(?P<name>[^|,\-–—]+?)\s*[|,\-–—]\s*(?P<addr>.+?)'
+    r'(?:\s*[|,\-–—(]\s*\(?(?P<lat>[+-]?\d+\.?\d*)\s*,\s*(?P<lon>[+-]?\d+\.?\d*)\)?)?\s*$'
+)
+
+
+def _parse_facilities_text(text_result: str, names: list, addrs: list, lats: list, lons: list, to_geocode: list):
     """
-    Converts Gemini's text output (numbered list) into a DataFrame with coordinates.
-    Tries to extract coordinates from text, or geocodes addresses if coordinates not found.
+    Regex fallback for numbered-list facility text, appending to the column lists.
+    Lines with trailing coordinates are used as-is; the rest are queued in
+    to_geocode.
     """
-    data = []
-    lines = text_result.split('\n')
+    # Facility lines are numbered, so text without any digit has nothing to parse
+    if not any(c.isdigit() for c in text_result):
+        return
+    
+    # Vectorized prefix probe: keep only lines starting with a digit (casting to
+    # U1 takes the first character), so prose/blank lines never reach the loop
+    lines = np.char.strip(np.array(text_result.split('\n')))
+    candidates = lines[np.char.isdigit(lines.astype("U1"))]
     
-    for line in lines:
-        line = line.strip()
-        if not line or not re.match(r'^\d+\.', line):
+    for line in candidates.tolist():
+        numbered = _COMBINED.match(line)
+        if not numbered:
+            continue
+        body = numbered.group("body")
+        match = ("|" in body and _BODY_PIPE.match(body)) or _BODY_WITH_COORDS.match(body)
+        if not match:
             continue
-            
-        # Try multiple patterns to extract information
-        # Pattern 1: "1. Name | Address | Lat, Lon"
-        match1 = re.match(r'^\d+\.\s*(.+?)\s*\|\s*(.+?)\s*\|\s*([+-]?\d+\.?\d*),\s*([+-]?\d+\.?\d*)', line)
-        if match1:
-            name, address, lat, lon = match1.groups()
-            try:
-                data.append({
-                    "name": name.strip(),
-                    "address": address.strip(),
-                    "lat": float(lat),
-                    "lon": float(lon)
-                })
-                continue
-            except ValueError:
-                pass
         
-        # Pattern 2: "1. Name, Address (Lat, Lon)" or "1. Name - Address - Lat, Lon"
-        match2 = re.search(r'([+-]?\d+\.?\d*)\s*,\s*([+-]?\d+\.?\d*)', line)
-        if match2:
-            lat, lon = match2.groups()
-            # Extract name and address (everything before the coordinates)
-            prefix = line[:match2.start()].strip()
-            # Remove leading number and period
-            prefix = re.sub(r'^\d+\.\s*', '', prefix)
-            # Try to split name and address
-            parts = re.split(r'[|,\-–—]', prefix, 1)
-            name = parts[0].strip() if parts else prefix
-            address = parts[1].strip() if len(parts) > 1 else prefix
-            
-            try:
-                data.append({
-                    "name": name,
-                    "address": address,
-                    "lat": float(lat),
-                    "lon": float(lon)
-                })
+        name, address, lat, lon = match.group("name", "addr", "lat", "lon")
+        if lat is None:
+            # Geocoded in the second pass
+            to_geocode.append(len(names))
+            lat = lon = math.nan
+        names.append(name.strip())
+        addrs.append(address.strip())
+        lats.append(float(lat))
+        lons.append(float(lon))
+
+
+def parse_facilities_to_df(text_result: str, hint: Optional[Tuple[float, float]] = None) -> pd.DataFrame:
+    """
+    Converts Gemini's facility search output into a DataFrame with coordinates.
+    The JSON array requested from Gemini is read directly; other text (older
+    numbered-list answers) goes through the regex fallback. Rows still missing
+    coordinates are then geocoded one at a time (Nominatim's rate limit),
+    bounded around hint (the searched location) when given.
+    """
+    # One list per column; rows without coordinates hold NaN so lat/lon are float64
+    names, addrs, lats, lons = [], [], [], []
+    to_geocode = []  # row indices still missing coordinates
+    
+    try:
+        facilities = json.loads(text_result)
+    except ValueError:
+        facilities = None
+    
+    if isinstance(facilities, list):
+        for item in facilities:
+            if not isinstance(item, dict) or not item.get("name"):
                 continue
-            except ValueError:
-                pass
-        
-        # Pattern 3: "1. Name, Address" - extract name and address, then geocode
-        match3 = re.match(r'^\d+\.\s*(.+?),\s*(.+)$', line)
-        if match3:
-            name, address = match3.groups()
-            name = name.strip()
-            address = address.strip()
-            
-            # Try to geocode the address
-            coords = geocode_address(address)
+            lat, lon = item.get("lat"), item.get("lon")
+            has_coords = isinstance(lat, (int, float)) and isinstance(lon, (int, float))
+            if not has_coords and item.get("address"):
+                to_geocode.append(len(names))
+            names.append(str(item["name"]).strip())
+            addrs.append(str(item.get("address", "")).strip())
+            lats.append(float(lat) if has_coords else math.nan)
+            lons.append(float(lon) if has_coords else math.nan)
+    else:
+        _parse_facilities_text(text_result, names, addrs, lats, lons, to_geocode)
+    
+    # Second pass: geocode the collected addresses (rate limited by Nominatim).
+    # Each distinct address is looked up once; rows that miss retry with their
+    # city-level locality (also deduplicated). Rows that still fail keep NaN.
+    if to_geocode:
+        resolved = _geocode_unique([addrs[i] for i in to_geocode], hint)
+        missing = [i for i in to_geocode if not resolved.get(_address_key(addrs[i]))]
+        if missing:
+            resolved.update(_geocode_unique([_city_key(addrs[i]) for i in missing], hint))
+        for i in to_geocode:
+            coords = resolved.get(_address_key(addrs[i])) or resolved.get(_city_key(addrs[i]))
             if coords:
-                data.append({
-                    "name": name,
-                    "address": address,
-                    "lat": coords[0],
-                    "lon": coords[1]
-                })
-            else:
-                # If geocoding fails, still add it without coordinates
-                data.append({
-                    "name": name,
-                    "address": address
-                })
-            continue
-        
-        # Pattern 4: Simple numbered list - try to parse manually
-        match4 = re.match(r'^\d+\.\s*(.+)$', line)
-        if match4:
-            content = match4.group(1).strip()
-            # Try to split by common delimiters
-            parts = [p.strip() for p in re.split(r'[|,\-–—]', content) if p.strip()]
-            if len(parts) >= 2:
-                name = parts[0]
-                address = ' '.join(parts[1:])
-                coords = geocode_address(address)
-                if coords:
-                    data.append({
-                        "name": name,
-                        "address": address,
-                        "lat": coords[0],
-                        "lon": coords[1]
-                    })
-                else:
-                    data.append({
-                        "name": name,
-                        "address": address
-                    })
-
-    return pd.DataFrame(data)
+                lats[i], lons[i] = coords
+
+    return _facilities_frame(names, addrs, lats, lons)
+
+
+def _address_key(address: str) -> str:
+    """Normalizes an address for deduplication."""
+    return address.strip().lower()
+
+
+def _city_key(address: str) -> str:
+    """Degrades an address to its last two comma parts (e.g. "austin, tx")."""
+    return _address_key(",".join(address.rsplit(",", 2)[-2:]))
+
+
+def _geocode_unique(addresses: list, hint: Optional[Tuple[float, float]] = None) -> dict:
+    """
+    Geocodes each distinct (normalized) address once; returns key -> coords.
+    Lookups run one at a time since Nominatim allows at most 1 request per second.
+    """
+    keys = dict.fromkeys(_address_key(a) for a in addresses if a.strip())
+    return {k: geocode_address(k, hint) for k in keys}
+
+
+def _facilities_frame(names: list, addrs: list, lats: list, lons: list) -> pd.DataFrame:
+    """Builds the facilities DataFrame from its columns, with float64 coordinates."""
+    return pd.DataFrame({
+        "name": names,
+        "address": addrs,
+        "lat": pd.array(lats, dtype="float64"),
+        "lon": pd.array(lons, dtype="float64"),
+    })
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; any argument may be a NumPy array."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
+
+def filter_by_radius(facilities_df: pd.DataFrame, lat: float, lon: float, radius_km: float = 10.0) -> pd.DataFrame:
+    """
+    Adds a dist_km column, drops facilities farther than radius_km from (lat, lon)
+    and sorts the rest nearest first. Rows without coordinates are kept at the end.
+    """
+    if facilities_df.empty:
+        return facilities_df
+    dist = haversine_km(lat, lon, facilities_df["lat"].to_numpy(), facilities_df["lon"].to_numpy())
+    df = facilities_df.assign(dist_km=dist)
+    df = df[~(df["dist_km"] > radius_km)]
+    return df.sort_values("dist_km").reset_index(drop=True)
+
+
+def format_facilities_markdown(text_result: str) -> str:
+    """
+    Renders a facility search result for display: a JSON array becomes a
+    numbered markdown list; anything else (warnings, plain text) is returned as is.
+    """
+    try:
+        facilities = json.loads(text_result)
+    except ValueError:
+        return text_result
+    if not isinstance(facilities, list):
+        return text_result
+    
+    lines = []
+    for i, item in enumerate(facilities, 1):
+        if isinstance(item, dict) and item.get("name"):
+            lines.append(f"{i}. **{item['name']}** — {item.get('address', '')}")
+    return "\n".join(lines) or "⚠️ No hospitals found. Try another location."
+
+
+# Session state key for the last (query, text, DataFrame) search result
+FACILITY_RESULTS_KEY = "_facility_results"
+
+
+def _search_and_parse(location_query: str) -> Tuple[str, pd.DataFrame]:
+    """
+    Searches and parses once per query, keeping the result in session state so
+    reruns (map zoom, scrolling, other widgets) reuse it without re-parsing or
+    re-geocoding. The search itself is also cached across sessions. Failed or
+    empty searches are not kept, so searching again retries them.
+    """
+    stored = st.session_state.get(FACILITY_RESULTS_KEY)
+    if stored and stored[0] == location_query:
+        return stored[1], stored[2]
+    
+    result_text = find_nearby_facilities(location_query)
+    facilities_df = parse_facilities_to_df(result_text)
+    if facilities_df.empty or result_text.startswith("⚠️"):
+        st.session_state.pop(FACILITY_RESULTS_KEY, None)
+    else:
+        st.session_state[FACILITY_RESULTS_KEY] = (location_query, result_text, facilities_df)
+    return result_text, facilities_df
 
 
 def show_facilities_results(location_query: str):
@@ -303,11 +611,9 @@ def show_facilities_results(location_query: str):
     st.subheader("🗺️ Nearby Healthcare Facilities")
 
     with st.spinner("Searching for nearby hospitals..."):
-        result_text = find_nearby_facilities(location_query)
-
-    st.markdown(result_text)
+        result_text, facilities_df = _search_and_parse(location_query)
 
-    facilities_df = parse_facilities_to_df(result_text)
+    st.markdown(format_facilities_markdown(result_text))
 
     if not facilities_df.empty:
         st.dataframe(facilities_df, use_container_width=True)
@@ -322,6 +628,9 @@ def create_interactive_map(facilities_df: pd.DataFrame, user_lat: float = None,
     """
     if facilities_df.empty or not {"lat", "lon"}.issubset(facilities_df.columns):
         return None
+    facilities_df = facilities_df.dropna(subset=["lat", "lon"])
+    if facilities_df.empty:
+        return None
     
     # Calculate center of map
     if user_lat and user_lon:
@@ -395,26 +704,52 @@ def create_interactive_map(facilities_df: pd.DataFrame, user_lat: float = None,
     return m
 
 
-def show_facilities_map(facilities_df: pd.DataFrame):
+def show_facilities_map(facilities_df: Optional[pd.DataFrame] = None):
     """
     Displays a map if lat/lon are available.
+    Defaults to the last search result stored by show_facilities_results.
     """
+    if facilities_df is None:
+        stored = st.session_state.get(FACILITY_RESULTS_KEY)
+        facilities_df = stored[2] if stored else pd.DataFrame()
+    if {"lat", "lon"}.issubset(facilities_df.columns):
+        facilities_df = facilities_df.dropna(subset=["lat", "lon"])
+    
     if not facilities_df.empty and {"lat", "lon"}.issubset(facilities_df.columns):
         st.map(facilities_df[["lat", "lon"]])
         st.markdown("### 🏥 Nearby Healthcare Facilities (Map)")
-        for _, row in facilities_df.iterrows():
-            st.markdown(f"**{row['name']}** \n📍 ({row['lat']:.4f}, {row['lon']:.4f})")
+        # One markdown block from the column arrays instead of a Series per row
+        names = facilities_df["name"].to_numpy()
+        lats = facilities_df["lat"].to_numpy()
+        lons = facilities_df["lon"].to_numpy()
+        st.markdown("\n\n".join(
+            f"**{name}** \n📍 ({lat:.4f}, {lon:.4f})" for name, lat, lon in zip(names, lats, lons)
+        ))
     else:
         st.warning("Map skipped — Gemini results do not include coordinates.")
 
 
 # --- Streamlit UI Layout ---
-st.set_page_config(page_title="Nearby Healthcare Finder", page_icon="🏥", layout="centered")
+def render():
+    """
+    Renders the standalone hospital finder page.
+    Page config is applied once per session; importing this module has no UI side effects.
+    """
+    if "_page_cfg_done" not in st.session_state:
+        st.set_page_config(page_title="Nearby Healthcare Finder", page_icon="🏥", layout="centered")
+        st.session_state["_page_cfg_done"] = True
+
+    st.title("🏥 Nearby Healthcare Facilities Finder")
+    st.write("Enter a city, state, or area to find hospitals near you.")
+
+    location_query = st.text_input("📍 Enter a location", placeholder="e.g., Austin, TX")
 
-st.title("🏥 Nearby Healthcare Facilities Finder")
-st.write("Enter a city, state, or area to find hospitals near you.")
+    clicked = st.button("Find Hospitals")
+    # Keep showing the last results across reruns until the query changes
+    stored = st.session_state.get(FACILITY_RESULTS_KEY)
+    if location_query and (clicked or (stored and stored[0] == location_query)):
+        show_facilities_results(location_query)
 
-location_query = st.text_input("📍 Enter a location", placeholder="e.g., Austin, TX")
 
-if st.button("Find Hospitals") and location_query:
-    show_facilities_results(location_query)
+if __name__ == "__main__":
+    render()
@@ -3,12 +3,446 @@ Voice Assistant for Accessibility
 Provides voice input/output for blind and visually impaired users
 """
 
+import hashlib
+import json
+import re
+from functools import lru_cache
+from itertools import chain
+
 import streamlit as st
 from streamlit_js_eval import streamlit_js_eval
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+
+
+# Sentence/clause ends get an ellipsis so browser voices pause naturally
+# (browsers don't support SSML breaks)
+_PAUSE_RE = re.compile(r'[.!?] |, ')
+_PAUSE_MAP = {'. ': '. ... ', '! ': '! ... ', '? ': '? ... ', ', ': ', .. '}
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Line breaks become spaces before JS string escaping
+_ESCAPE_TABLE = str.maketrans({'\n': ' ', '\r': ' '})
+
+# Characters JSON would escape in ASCII text: quotes, backslashes and controls
+_NEEDS_ESCAPE_RE = re.compile(r'["\\\x00-\x1f\x7f]')
+
+# A first aid step: "1. text", "2) text", "• text", "- text" or "* text" (not **bold**)
+_STEP_LINE_RE = re.compile(r'^[ \t]*(?:\d+[.)]?|[•\-*](?!\*))[ \t]*([^\s.)].*?)[ \t]*$', re.M)
+
+# Session state key for announcements waiting on flush_speech_queue
+SPEECH_QUEUE_KEY = "_tts_queue"
+
+# Session state key for the last announcement made by each announce_* function
+ANNOUNCED_KEY = "_spoken_announcements"
+
+# Picks the most natural installed voice (shared by the TTS scripts). Each voice
+# is ranked in one pass against PRIORITY_TABLE rows of [name substrings that
+# must all match, lang prefix, priority], ordered best first; the first voice
+# with the lowest priority wins. Each streamlit_js_eval key runs in its own
+# iframe, so the pick is cached by name on the (same-origin) parent page, where
+# later scripts and prewarm_voices() can share it and skip the ranking.
+_SELECT_VOICE_JS = """
+const VOICE_HOST = (() => {
+    try { return window.parent.document ? window.parent : window; } catch (e) { return window; }
+})();
+
+const PRIORITY_TABLE = [
+    // Premium Neural Voices (Siri/Gemini quality): Google Neural TTS, then Microsoft (Azure)
+    [['Google', 'Neural'], '', 1],
+    [['Microsoft Zira'], '', 2],
+    [['Microsoft Aria'], '', 2],
+    [['Microsoft', 'Neural'], '', 2],
+    // Apple Siri Voices (Mac/iOS - very natural)
+    [['Samantha'], '', 3],
+    [['Victoria'], '', 3],
+    [['Fiona'], '', 3],
+    [['Alex'], '', 3],
+    [['Karen'], '', 3],
+    // Any Neural voice (highest quality)
+    [['Neural'], '', 4],
+    [['Wavenet'], '', 4],
+    [['Premium'], '', 4],
+    // Google Standard voices, then Microsoft standard voices
+    [['Google US English'], '', 5],
+    [['Google UK English'], '', 5],
+    [['Microsoft'], 'en', 6],
+    // Any female English voice, then US English, then any English voice
+    [['Female'], 'en', 7],
+    [['Woman'], 'en', 7],
+    [[], 'en-US', 8],
+    [[], 'en', 9],
+];
+
+function priorityOf(v) {
+    for (const [subs, lang, pri] of PRIORITY_TABLE) {
+        if (v.lang.startsWith(lang) && subs.every(s => v.name.includes(s))) return pri;
+    }
+    return Infinity;
+}
+
+function selectBestVoice() {
+    const voices = window.speechSynthesis.getVoices();
+    if (VOICE_HOST.__faa_voice_name) {
+        const cached = voices.find(v => v.name === VOICE_HOST.__faa_voice_name);
+        if (cached) return cached;
+    }
+    
+    let best = Infinity, selectedVoice = null;
+    voices.forEach(v => {
+        const p = priorityOf(v);
+        if (p < best) {
+            best = p;
+            selectedVoice = v;
+        }
+    });
+    if (selectedVoice) VOICE_HOST.__faa_voice_name = selectedVoice.name;
+    return selectedVoice;
+}
+
+// Runs fn once this frame's voices are available
+function whenVoicesReady(fn) {
+    if (window.speechSynthesis.getVoices().length > 0) {
+        fn();
+    } else {
+        window.speechSynthesis.addEventListener('voiceschanged', fn, {once: true});
+    }
+}
+"""
+
+# Browser TTS script; {sentences} (a JSON array), {rate}, {pitch}, {volume}
+# and {select_voice} are filled per call
+_SPEAK_JS_TEMPLATE = """
+        (function() {{
+            // Stop any ongoing speech first
+            window.speechSynthesis.cancel();
+            
+            {select_voice}
+            
+            const speakNatural = () => {{
+                // If voices not loaded yet, wait for them
+                whenVoicesReady(speakWithVoice);
+                
+                function speakWithVoice() {{
+                    const selectedVoice = selectBestVoice();
+                    
+                    if (selectedVoice) {{
+                        console.log('Using premium voice:', selectedVoice.name, 'Language:', selectedVoice.lang);
+                    }}
+                    
+                    // Speak sentence by sentence with natural pauses
+                    const sentences = {sentences};
+                    
+                    let idx = 0;
+                    const speakNext = () => {{
+                        if (idx < sentences.length) {{
+                            const sentUtterance = new SpeechSynthesisUtterance(sentences[idx].trim());
+                            if (selectedVoice) sentUtterance.voice = selectedVoice;
+                            sentUtterance.lang = 'en-US';
+                            // Natural speech parameters for Siri/Gemini-like quality
+                            sentUtterance.rate = {rate};
+                            sentUtterance.pitch = {pitch};
+                            sentUtterance.volume = {volume};
+                            
+                            sentUtterance.onend = () => {{
+                                idx++;
+                                if (idx < sentences.length) {{
+                                    setTimeout(speakNext, 350); // Natural pause
+                                }}
+                            }};
+                            
+                            window.speechSynthesis.speak(sentUtterance);
+                        }}
+                    }};
+                    speakNext();
+                }}
+            }};
+            
+            // Trigger voice loading and speak
+            speakNatural();
+            
+            return true;
+        }})()
+"""
+
+# Sentence-streaming TTS script; {sentences} is a JSON array of [text, rate, pitch].
+# The first sentence is spoken immediately and the rest are queued during idle
+# time in growing batches (2, 4, 8, ...), so speech starts without waiting on
+# the whole text.
+_STREAM_JS_TEMPLATE = """
+        (function() {{
+            window.speechSynthesis.cancel();
+            
+            {select_voice}
+            
+            const sentences = {sentences};
+            
+            const speakAll = () => {{
+                const voice = selectBestVoice();
+                const queue = ([sentence, rate, pitch]) => {{
+                    const u = new SpeechSynthesisUtterance(sentence);
+                    if (voice) u.voice = voice;
+                    u.rate = rate;
+                    u.pitch = pitch;
+                    u.volume = {volume};
+                    u.lang = 'en-US';
+                    window.speechSynthesis.speak(u);
+                }};
+                
+                queue(sentences[0]);
+                
+                const idle = window.requestIdleCallback || ((cb) => setTimeout(cb, 20));
+                let idx = 1, batch = 2;
+                const pump = () => {{
+                    sentences.slice(idx, idx + batch).forEach(queue);
+                    idx += batch;
+                    batch *= 2;
+                    if (idx < sentences.length) idle(pump);
+                }};
+                if (idx < sentences.length) idle(pump);
+            }};
+            
+            // If voices not loaded yet, wait for them
+            whenVoicesReady(speakAll);
+            
+            return true;
+        }})()
+"""
+
+
+# Google Cloud TTS playback from a media URL: the MP3 is fed to a MediaSource
+# chunk by chunk as it downloads, so playback starts on the first chunk.
+# Browsers without MP3 MediaSource support get the URL as a plain audio src.
+_AUDIO_STREAM_JS_TEMPLATE = """
+        (function() {{
+            const url = {url};
+            const audio = new Audio();
+            audio.autoplay = true;
+            
+            if (!(window.MediaSource && MediaSource.isTypeSupported('audio/mpeg'))) {{
+                audio.src = url;
+                return true;
+            }}
+            
+            const ms = new MediaSource();
+            audio.src = URL.createObjectURL(ms);
+            ms.addEventListener('sourceopen', async () => {{
+                const sb = ms.addSourceBuffer('audio/mpeg');
+                const reader = (await fetch(url)).body.getReader();
+                while (true) {{
+                    const {{done, value}} = await reader.read();
+                    if (done) {{
+                        ms.endOfStream();
+                        break;
+                    }}
+                    sb.appendBuffer(value);
+                    await new Promise(r => sb.addEventListener('updateend', r, {{once: true}}));
+                }}
+            }}, {{once: true}});
+            
+            return true;
+        }})()
+"""
 
+# Loads the voice list and caches the best voice before anything is spoken
+_PREWARM_JS = """
+(function() {
+""" + _SELECT_VOICE_JS + """
+    whenVoicesReady(selectBestVoice);
+    return true;
+})()
+"""
+
+
+# Voice command recognition. A fresh single-shot recognizer per call: the
+# component iframe is torn down on the next rerun, and a one-result session
+# releases the microphone as soon as the command is heard.
+_LISTEN_JS = """
+        new Promise((resolve) => {
+            const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
+            if (!SpeechRecognition) {
+                resolve({error: "Speech recognition not supported in this browser. Please use Chrome, Edge, or Safari."});
+                return;
+            }
+            
+            const recognition = new SpeechRecognition();
+            recognition.continuous = false;
+            recognition.interimResults = false;
+            recognition.lang = 'en-US';
+            
+            recognition.onresult = (event) => {
+                const best = event.results[0][0];
+                resolve({text: best.transcript, confidence: best.confidence});
+            };
+            
+            recognition.onerror = (event) => {
+                let errorMsg = "I'm having trouble hearing you";
+                if (event.error === 'no-speech') {
+                    errorMsg = "I didn't hear anything. Please try speaking again.";
+                } else if (event.error === 'audio-capture') {
+                    errorMsg = "I can't access your microphone. Please check your microphone settings.";
+                } else if (event.error === 'not-allowed') {
+                    errorMsg = "Microphone permission is needed. Please allow microphone access in your browser settings.";
+                }
+                resolve({error: errorMsg});
+            };
+            
+            recognition.start();
+        })
+"""
+
+@lru_cache(maxsize=256)
+def _digest(*parts) -> str:
+    """
+    Stable short key for streamlit_js_eval components. Unlike hash(), it is the
+    same across processes, so an unchanged announcement keeps its component.
+    Cached since reruns key the same announcements over and over.
+    """
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+
+
+def _js_string(text: str) -> str:
+    """
+    Double-quoted JS string literal for text, with line breaks spoken as spaces.
+    Plain ASCII text (nearly every announcement) is quoted as is.
+    """
+    if text.isascii() and not _NEEDS_ESCAPE_RE.search(text):
+        return f'"{text}"'
+    return json.dumps(text.translate(_ESCAPE_TABLE))
+
+
+def _add_pauses(text: str) -> str:
+    """Adds an ellipsis after sentence ends (...) and commas (..) for natural pauses."""
+    return _PAUSE_RE.sub(lambda m: _PAUSE_MAP[m.group(0)], text.strip())
+
+
+@lru_cache(maxsize=128)
+def _build_speak_js(text: str, sentences: Optional[Tuple[str, ...]], rate: float, pitch: float, volume: float) -> str:
+    """
+    Builds the browser TTS script for a text; repeated announcements reuse the result.
+    Sentences are split here (unless given) and passed to the script as a JSON array.
+    """
+    if sentences is None:
+        sentences = _SENTENCE_SPLIT_RE.split(text.strip())
+    
+    # Add pauses after punctuation and encode as a JS array for the script
+    return _SPEAK_JS_TEMPLATE.format_map({
+        "sentences": f"[{','.join(_js_string(_add_pauses(s)) for s in sentences if s.strip())}]",
+        "rate": rate,
+        "pitch": pitch,
+        "volume": volume,
+        "select_voice": _SELECT_VOICE_JS,
+    })
+
+
+@lru_cache(maxsize=64)
+def _build_stream_js(sentences: Tuple[Tuple[str, float, float], ...], volume: float) -> str:
+    """Builds the sentence-streaming TTS script for (text, rate, pitch) items."""
+    return _STREAM_JS_TEMPLATE.format_map({
+        "sentences": f"[{','.join(f'[{_js_string(_add_pauses(text))},{rate},{pitch}]' for text, rate, pitch in sentences)}]",
+        "volume": volume,
+        "select_voice": _SELECT_VOICE_JS,
+    })
+
+
+def _speak_stream(sentences: List[Tuple[str, float, float]], volume: float = 1.0) -> bool:
+    """
+    Speaks (text, rate, pitch) sentences with the browser's text-to-speech in a
+    single script, starting on the first sentence right away.
+    
+    Returns:
+        True if successful
+    """
+    sentences = tuple((text, rate, pitch) for text, rate, pitch in sentences if text.strip())
+    if not sentences:
+        return False
+    try:
+        streamlit_js_eval(
+            js_expressions=_build_stream_js(sentences, volume),
+            key=f"speak_stream_{_digest(*sentences)}",
+            want_output=False
+        )
+        return True
+    except Exception as e:
+        st.error(f"Error speaking text: {e}")
+        return False
 
-def speak_text(text: str, rate: float = 0.92, pitch: float = 1.0, volume: float = 1.0, voice_name: Optional[str] = None, use_google_tts: bool = False) -> bool:
+
+def _enqueue_speech(text: str, rate: float = 0.92, pitch: float = 1.0, use_google_tts: bool = False) -> bool:
+    """
+    Queues an announcement for flush_speech_queue instead of emitting a
+    component per call. Google Cloud TTS audio can't join the browser's queue,
+    so premium requests are spoken directly.
+    """
+    if use_google_tts:
+        return speak_text(text, rate=rate, pitch=pitch, use_google_tts=True)
+    return _enqueue_sentences(_SENTENCE_SPLIT_RE.split(text.strip()), rate, pitch)
+
+
+def _enqueue_sentences(sentences: Iterable[str], rate: float, pitch: float) -> bool:
+    """Queues already-split sentences for flush_speech_queue."""
+    queue = st.session_state.setdefault(SPEECH_QUEUE_KEY, [])
+    queue.extend((sentence, rate, pitch) for sentence in sentences if sentence)
+    return True
+
+
+def flush_speech_queue() -> bool:
+    """
+    Speaks every announcement queued during this script run with one
+    streamlit_js_eval call. Call once at the end of the app script; anything
+    queued before an st.rerun() is spoken on the next run.
+    """
+    queue = st.session_state.pop(SPEECH_QUEUE_KEY, None)
+    if not queue:
+        return True
+    return _speak_stream(queue)
+
+
+def _media_url(audio_data: bytes, key: str) -> Optional[str]:
+    """
+    Registers MP3 bytes with Streamlit's media file manager and returns the URL
+    it serves them from, or None if the runtime isn't available.
+    """
+    try:
+        from streamlit.runtime import get_instance
+        return get_instance().media_file_mgr.add(audio_data, "audio/mpeg", f"google_tts_{key}")
+    except Exception:
+        return None
+
+
+def _already_announced(name: str, *args) -> bool:
+    """
+    True if name's last announcement had the same arguments, so reruns don't
+    repeat it; otherwise records this one and returns False.
+    """
+    spoken = st.session_state.setdefault(ANNOUNCED_KEY, {})
+    key = _digest(name, *args)
+    if spoken.get(name) == key:
+        return True
+    spoken[name] = key
+    return False
+
+
+def reset_announcement_cache():
+    """Forgets past announcements so the next ones are spoken again (e.g. on "repeat")."""
+    st.session_state.pop(ANNOUNCED_KEY, None)
+
+
+def prewarm_voices() -> bool:
+    """
+    Picks the browser voice once per session and caches its name on the
+    parent page, so announcements look it up instead of ranking every voice.
+    """
+    if st.session_state.get("_voices_prewarmed"):
+        return True
+    try:
+        streamlit_js_eval(js_expressions=_PREWARM_JS, key="prewarm_voices", want_output=False)
+        st.session_state["_voices_prewarmed"] = True
+        return True
+    except Exception:
+        return False
+
+
+def speak_text(text: str, rate: float = 0.92, pitch: float = 1.0, volume: float = 1.0, voice_name: Optional[str] = None, use_google_tts: bool = False, sentences: Optional[List[str]] = None) -> bool:
     """
     Use browser's text-to-speech with premium voice selection for natural, Siri-like quality.
     Prioritizes neural/high-quality voices similar to Siri or Gemini AI.
@@ -19,6 +453,7 @@ def speak_text(text: str, rate: float = 0.92, pitch: float = 1.0, volume: float
         pitch: Voice pitch (0 to 2, default 1.0 - natural pitch)
         volume: Voice volume (0 to 1, default 1.0)
         voice_name: Preferred voice name (optional)
+        sentences: The text already split into sentences (optional; split here otherwise)
     
     Returns:
         True if successful
@@ -32,13 +467,20 @@ def speak_text(text: str, rate: float = 0.92, pitch: float = 1.0, volume: float
                     voice_names = get_premium_voice_names()
                     audio_data = speak_with_google_tts(text, voice_names["female_natural"], use_api=True)
                     if audio_data:
-                        # Play audio using HTML5 audio element
-                        import base64
-                        audio_b64 = base64.b64encode(audio_data).decode()
-                        audio_html = f'<audio autoplay><source src="data:audio/mp3;base64,{audio_b64}" type="audio/mpeg"></audio>'
+                        key = _digest(text)
+                        url = _media_url(audio_data, key)
+                        if url:
+                            # Stream from Streamlit's media endpoint instead of inlining the MP3
+                            js_code = _AUDIO_STREAM_JS_TEMPLATE.format_map({"url": json.dumps(url)})
+                        else:
+                            # Play audio using HTML5 audio element
+                            import base64
+                            audio_b64 = base64.b64encode(audio_data).decode()
+                            audio_html = f'<audio autoplay><source src="data:audio/mp3;base64,{audio_b64}" type="audio/mpeg"></audio>'
+                            js_code = f'document.body.insertAdjacentHTML("beforeend", `{audio_html}`); setTimeout(() => {{ const el = document.body.lastElementChild; if(el) el.remove(); }}, 5000);'
                         streamlit_js_eval(
-                            js_expressions=f'document.body.insertAdjacentHTML("beforeend", `{audio_html}`); setTimeout(() => {{ const el = document.body.lastElementChild; if(el) el.remove(); }}, 5000);',
-                            key=f"google_tts_{hash(text)}",
+                            js_expressions=js_code,
+                            key=f"google_tts_{key}",
                             want_output=False
                         )
                         return True
@@ -47,174 +489,11 @@ def speak_text(text: str, rate: float = 0.92, pitch: float = 1.0, volume: float
                 pass
         
         # Enhanced browser TTS with premium voice selection (Siri-like voices)
-        # Clean and prepare text for natural speech with SSML-like pauses
-        text = text.strip()
-        # Add natural pauses and emphasis for better flow
-        text = text.replace('. ', '. <break time="300ms"/> ')
-        text = text.replace('! ', '! <break time="400ms"/> ')
-        text = text.replace('? ', '? <break time="400ms"/> ')
-        text = text.replace(', ', ', <break time="200ms"/> ')
-        # Remove SSML tags (browsers don't support SSML, but we'll format for natural speech)
-        text = text.replace('<break time="300ms"/>', '...')
-        text = text.replace('<break time="400ms"/>', '...')
-        text = text.replace('<break time="200ms"/>', '..')
-        
-        # Escape quotes in text
-        escaped_text = text.replace('"', '\\"').replace("'", "\\'").replace('\n', ' ')
-        
-        js_code = f"""
-        (function() {{
-            // Stop any ongoing speech first
-            window.speechSynthesis.cancel();
-            
-            const speakNatural = () => {{
-                const utterance = new SpeechSynthesisUtterance("{escaped_text}");
-                utterance.rate = {rate};
-                utterance.pitch = {pitch};
-                utterance.volume = {volume};
-                utterance.lang = 'en-US';
-                
-                // Get all available voices
-                let allVoices = window.speechSynthesis.getVoices();
-                
-                // If voices not loaded yet, wait for them
-                if (allVoices.length === 0) {{
-                    window.speechSynthesis.onvoiceschanged = () => {{
-                        allVoices = window.speechSynthesis.getVoices();
-                        selectBestVoice();
-                    }};
-                }} else {{
-                    selectBestVoice();
-                }}
-                
-                function selectBestVoice() {{
-                    let selectedVoice = null;
-                    
-                    // Priority 1: Premium Neural Voices (Siri/Gemini quality)
-                    // Google Neural TTS (most natural, available in Chrome/Edge)
-                    selectedVoice = allVoices.find(v => 
-                        v.name.includes('Google US English Neural') ||
-                        v.name.includes('Google UK English Neural') ||
-                        (v.name.includes('Google') && v.name.includes('Neural'))
-                    );
-                    
-                    // Priority 2: Microsoft Neural Voices (Azure - very natural)
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.name.includes('Microsoft Zira') ||
-                            v.name.includes('Microsoft Aria') ||
-                            v.name.includes('Microsoft Jenny Neural') ||
-                            (v.name.includes('Microsoft') && v.name.includes('Neural'))
-                        );
-                    }}
-                    
-                    // Priority 3: Apple Siri Voices (Mac/iOS - very natural)
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.name.includes('Samantha') ||
-                            v.name.includes('Victoria') ||
-                            v.name.includes('Fiona') ||
-                            v.name.includes('Alex') ||
-                            v.name.includes('Karen')
-                        );
-                    }}
-                    
-                    // Priority 4: Any Neural voice (highest quality)
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.name.includes('Neural') ||
-                            v.name.includes('Wavenet') ||
-                            v.name.includes('Premium')
-                        );
-                    }}
-                    
-                    // Priority 5: Google Standard voices (still good quality)
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.name.includes('Google US English') ||
-                            v.name.includes('Google UK English')
-                        );
-                    }}
-                    
-                    // Priority 6: Microsoft standard voices
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.name.includes('Microsoft') && v.lang.startsWith('en')
-                        );
-                    }}
-                    
-                    // Priority 7: Any high-quality female voice
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.lang.startsWith('en') && 
-                            (v.name.includes('Female') || 
-                             v.name.includes('Woman'))
-                        );
-                    }}
-                    
-                    // Priority 8: Any English voice with US locale (most natural accent)
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => 
-                            v.lang === 'en-US' || v.lang.startsWith('en-US')
-                        );
-                    }}
-                    
-                    // Fallback: Any English voice
-                    if (!selectedVoice) {{
-                        selectedVoice = allVoices.find(v => v.lang.startsWith('en'));
-                    }}
-                    
-                    if (selectedVoice) {{
-                        utterance.voice = selectedVoice;
-                        console.log('Using premium voice:', selectedVoice.name, 'Language:', selectedVoice.lang);
-                    }}
-                    
-                    // Natural speech parameters for Siri/Gemini-like quality
-                    utterance.rate = {rate};  // Natural pace
-                    utterance.pitch = {pitch};  // Natural pitch
-                    utterance.volume = {volume};
-                    
-                    // Speak with natural pauses for longer text
-                    const sentences = "{escaped_text}".split(/(?<=[\\.!?])\\s+/).filter(s => s.trim());
-                    
-                    if (sentences.length > 3) {{
-                        // Speak in chunks with natural pauses
-                        let idx = 0;
-                        const speakNext = () => {{
-                            if (idx < sentences.length) {{
-                                const sentUtterance = new SpeechSynthesisUtterance(sentences[idx].trim());
-                                if (selectedVoice) sentUtterance.voice = selectedVoice;
-                                sentUtterance.rate = utterance.rate;
-                                sentUtterance.pitch = utterance.pitch;
-                                sentUtterance.volume = utterance.volume;
-                                
-                                sentUtterance.onend = () => {{
-                                    idx++;
-                                    if (idx < sentences.length) {{
-                                        setTimeout(speakNext, 350); // Natural pause
-                                    }}
-                                }};
-                                
-                                window.speechSynthesis.speak(sentUtterance);
-                            }}
-                        }};
-                        speakNext();
-                    }} else {{
-                        window.speechSynthesis.speak(utterance);
-                    }}
-                }}
-            }};
-            
-            // Trigger voice loading and speak
-            speakNatural();
-            
-            return true;
-        }})()
-        """
+        js_code = _build_speak_js(text, tuple(sentences) if sentences else None, rate, pitch, volume)
         
         streamlit_js_eval(
             js_expressions=js_code,
-            key=f"speak_{hash(text)}",
+            key=f"speak_{_digest(text, rate, pitch)}",
             want_output=False
         )
         return True
@@ -247,49 +526,9 @@ def listen_for_command(callback_function: Optional[str] = None) -> Dict[str, Any
         Dict with 'text' and 'confidence' keys
     """
     try:
-        js_code = """
-        new Promise((resolve) => {
-            if (!('webkitSpeechRecognition' in window) && !('SpeechRecognition' in window)) {
-                resolve({error: "Speech recognition not supported in this browser. Please use Chrome, Edge, or Safari."});
-                return;
-            }
-            
-            const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
-            const recognition = new SpeechRecognition();
-            
-            recognition.continuous = false;
-            recognition.interimResults = false;
-            recognition.lang = 'en-US';
-            
-            recognition.onresult = (event) => {
-                const transcript = event.results[0][0].transcript;
-                const confidence = event.results[0][0].confidence;
-                resolve({text: transcript, confidence: confidence});
-            };
-            
-            recognition.onerror = (event) => {
-                let errorMsg = "I'm having trouble hearing you";
-                if (event.error === 'no-speech') {
-                    errorMsg = "I didn't hear anything. Please try speaking again.";
-                } else if (event.error === 'audio-capture') {
-                    errorMsg = "I can't access your microphone. Please check your microphone settings.";
-                } else if (event.error === 'not-allowed') {
-                    errorMsg = "Microphone permission is needed. Please allow microphone access in your browser settings.";
-                }
-                resolve({error: errorMsg});
-            };
-            
-            recognition.onend = () => {
-                // Recognition ended
-            };
-            
-            recognition.start();
-        })
-        """
-        
         result = streamlit_js_eval(
-            js_expressions=js_code,
-            key=f"listen_{hash(str(callback_function))}",
+            js_expressions=_LISTEN_JS,
+            key=f"listen_{_digest(callback_function)}",
             want_output=True
         )
         
@@ -299,66 +538,78 @@ def listen_for_command(callback_function: Optional[str] = None) -> Dict[str, Any
         return {"error": f"Error listening: {str(e)}"}
 
 
+@lru_cache(maxsize=64)
+def _build_page_announcement(page_name: str, content_summary: str) -> str:
+    """Page navigation announcement text, built once per page/summary."""
+    return f"You're now on the {page_name} page. {content_summary} How can I help you?"
+
+
 def announce_page_content(page_name: str, content_summary: str, use_premium: bool = True) -> bool:
     """Announce page content when navigating with natural phrasing."""
-    announcement = f"You're now on the {page_name} page. {content_summary} How can I help you?"
-    return speak_text(announcement, rate=0.92, pitch=1.0, use_google_tts=use_premium and "GCP_TTS_API_KEY" in st.secrets if hasattr(st, 'secrets') else False)
+    if _already_announced("page_content", page_name, content_summary):
+        return True
+    announcement = _build_page_announcement(page_name, content_summary)
+    return _enqueue_speech(announcement, rate=0.92, pitch=1.0, use_google_tts=use_premium and "GCP_TTS_API_KEY" in st.secrets if hasattr(st, 'secrets') else False)
+
+
+# Analysis announcement parts by severity and emergency level
+_SEVERITY_ANNOUNCEMENTS = {
+    "SEVERE": "I've detected a severe injury. Urgent medical attention is needed.",
+    "MODERATE": "I've identified a moderate injury. I recommend seeing a healthcare professional within 24 hours.",
+    "MINOR": "I've identified a minor injury. Let me guide you through the first aid steps.",
+    "UNKNOWN": "I've analyzed your injury. Let me provide first aid guidance."
+}
+
+_EMERGENCY_ANNOUNCEMENTS = {
+    "EMERGENCY": "Please note: This appears to be an emergency situation. Please call emergency services at 9-1-1 immediately.",
+    "URGENT": "Important: This requires urgent medical attention. Please seek care within the next few hours.",
+    "ROUTINE": "This is a routine injury. Following the first aid steps should help."
+}
+
+
+@lru_cache(maxsize=64)
+def _build_injury_analysis(severity: str, emergency_level: str, has_steps: bool) -> str:
+    """Analysis announcement text, built once per severity/emergency combination."""
+    steps_ready = " First aid instructions are ready. Say 'read steps' anytime to hear them, or I can guide you through each step." if has_steps else ""
+    return f"{_SEVERITY_ANNOUNCEMENTS.get(severity, '')} {_EMERGENCY_ANNOUNCEMENTS.get(emergency_level, '')}{steps_ready}"
 
 
 def announce_injury_analysis(severity: str, emergency_level: str, has_steps: bool = True) -> bool:
     """Announce injury analysis results with clear, calm professional tone."""
-    severity_announcement = {
-        "SEVERE": "I've detected a severe injury. Urgent medical attention is needed.",
-        "MODERATE": "I've identified a moderate injury. I recommend seeing a healthcare professional within 24 hours.",
-        "MINOR": "I've identified a minor injury. Let me guide you through the first aid steps.",
-        "UNKNOWN": "I've analyzed your injury. Let me provide first aid guidance."
-    }
-    
-    emergency_announcement = {
-        "EMERGENCY": "Please note: This appears to be an emergency situation. Please call emergency services at 9-1-1 immediately.",
-        "URGENT": "Important: This requires urgent medical attention. Please seek care within the next few hours.",
-        "ROUTINE": "This is a routine injury. Following the first aid steps should help."
-    }
-    
-    announcement = f"{severity_announcement.get(severity, '')} {emergency_announcement.get(emergency_level, '')}"
-    if has_steps:
-        announcement += " First aid instructions are ready. Say 'read steps' anytime to hear them, or I can guide you through each step."
+    announcement = _build_injury_analysis(severity, emergency_level, has_steps)
     
     # Use slightly slower rate for important medical information, natural pitch
-    return speak_text(announcement, rate=0.88, pitch=1.0, use_google_tts=False)
+    return _enqueue_speech(announcement, rate=0.88, pitch=1.0)
 
 
 def announce_first_aid_steps(steps_text: str) -> bool:
     """Announce first aid steps in a clear, structured, and reassuring way."""
-    # Clean and format steps for better speech
-    lines = steps_text.split('\n')
-    steps_only = []
+    # Numbered or bulleted lines, with the marker stripped, matched lazily
+    steps = _STEP_LINE_RE.finditer(steps_text)
     
-    for line in lines:
-        line = line.strip()
-        if line and (line[0].isdigit() or line.startswith('•') or line.startswith('-')):
-            # Clean up step text
-            step_clean = line.lstrip('0123456789.•-* ).').strip()
-            if step_clean:
-                steps_only.append(step_clean)
-    
-    if steps_only:
-        # More natural phrasing with pauses
-        full_text = "Here are your first aid instructions. I'll go through each step clearly. "
-        full_text += ". ".join([f"Step {i+1}. {step}" for i, step in enumerate(steps_only)])
-        full_text += ". Remember, if the situation worsens or you're unsure, seek professional medical help immediately."
+    if (first := next(steps, None)) is not None:
+        # One sentence per step so speech starts as soon as the intro is spoken;
+        # the sentences stream straight into the queue without an interim list
+        numbered = (f"Step {i}. {m.group(1)}" for i, m in enumerate(chain((first,), steps), 1))
+        sentences = chain(
+            ("Here are your first aid instructions. I'll go through each step clearly.",),
+            numbered,
+            ("Remember, if the situation worsens or you're unsure, seek professional medical help immediately.",),
+        )
+        # Slower rate for instructions to ensure clarity, natural pitch
+        return _enqueue_sentences(sentences, rate=0.88, pitch=1.0)
     else:
         # Format plain text for better speech
         full_text = "First aid instructions. " + steps_text.replace('\n', '. ')
     
     # Slower rate for instructions to ensure clarity, natural pitch
-    return speak_text(full_text, rate=0.88, pitch=1.0, use_google_tts=False)
+    return _enqueue_speech(full_text, rate=0.88, pitch=1.0)
 
 
 def announce_record_created(record_type: str) -> bool:
     """Announce when a record is created with friendly confirmation."""
     announcement = f"Perfect! I've saved your {record_type} record. You can view it anytime in your Health Records section."
-    return speak_text(announcement, rate=0.92, pitch=1.0, use_google_tts=False)
+    return _enqueue_speech(announcement, rate=0.92, pitch=1.0)
 
 
 def announce_statistics(stats: Dict[str, Any]) -> bool:
@@ -371,35 +622,39 @@ def announce_statistics(stats: Dict[str, Any]) -> bool:
     if total == 0:
         announcement = "You don't have any health records yet. Records will be created automatically when you analyze injuries."
     else:
-        announcement = f"Here's a summary of your health records. You have {total} total records. "
+        parts = [f"Here's a summary of your health records. You have {total} total records. "]
         if active > 0:
-            announcement += f"{active} active injury or injuries that need attention. "
+            parts.append(f"{active} active injury or injuries that need attention. ")
         if healed > 0:
-            announcement += f"Great news, {healed} injury or injuries have been healed. "
+            parts.append(f"Great news, {healed} injury or injuries have been healed. ")
         if most_common:
-            announcement += f"The most commonly affected area is {most_common}."
+            parts.append(f"The most commonly affected area is {most_common}.")
+        announcement = "".join(parts)
     
-    return speak_text(announcement, rate=0.90, pitch=1.0, use_google_tts=False)
+    return _enqueue_speech(announcement, rate=0.90, pitch=1.0)
 
 
+# Voice command phrase -> page name or action
+_COMMANDS = {
+    "go to first aid": "First Aid Guide",
+    "first aid guide": "First Aid Guide",
+    "analyze injury": "First Aid Guide",
+    "go to hospitals": "Find Nearby Hospitals",
+    "find hospitals": "Find Nearby Hospitals",
+    "hospitals": "Find Nearby Hospitals",
+    "go to records": "📋 My Health Records",
+    "health records": "📋 My Health Records",
+    "my records": "📋 My Health Records",
+    "read steps": "read_first_aid_steps",
+    "repeat": "repeat_last",
+    "stop": "stop_speaking",
+    "help": "show_voice_help",
+    "what can i say": "show_voice_help",
+}
+
 def get_voice_navigation_commands() -> Dict[str, str]:
     """Return map of voice commands to actions."""
-    return {
-        "go to first aid": "First Aid Guide",
-        "first aid guide": "First Aid Guide",
-        "analyze injury": "First Aid Guide",
-        "go to hospitals": "Find Nearby Hospitals",
-        "find hospitals": "Find Nearby Hospitals",
-        "hospitals": "Find Nearby Hospitals",
-        "go to records": "📋 My Health Records",
-        "health records": "📋 My Health Records",
-        "my records": "📋 My Health Records",
-        "read steps": "read_first_aid_steps",
-        "repeat": "repeat_last",
-        "stop": "stop_speaking",
-        "help": "show_voice_help",
-        "what can i say": "show_voice_help",
-    }
+    return dict(_COMMANDS)
 
 
 def process_voice_command(command: str) -> Optional[str]:
@@ -413,36 +668,38 @@ def process_voice_command(command: str) -> Optional[str]:
         Action name or None
     """
     command_lower = command.lower().strip()
-    commands = get_voice_navigation_commands()
     
     # Direct match
-    if command_lower in commands:
-        return commands[command_lower]
+    if command_lower in _COMMANDS:
+        return _COMMANDS[command_lower]
     
-    # Partial match
-    for cmd_key, action in commands.items():
+    # Partial match: a known phrase inside the command, or the command inside a
+    # phrase (e.g. a cut-off "first aid"); the first phrase in table order wins
+    for cmd_key, action in _COMMANDS.items():
         if cmd_key in command_lower or command_lower in cmd_key:
             return action
     
     return None
 
 
+_WELCOME_TEXT = (
+    "Hello! Welcome to AidNexus, your AI-powered First Aid Assistant. I'm your voice assistant, and I'm here to help. "
+    "You can navigate the entire application using voice commands. "
+    "Simply say 'help' anytime to hear all available commands. "
+    "To navigate, say the page name, like 'First Aid Guide' or 'My Health Records'. "
+    "How can I assist you today?"
+)
+
+
 def speak_welcome_message(use_premium: bool = True) -> bool:
     """Welcome message for voice assistant with friendly, professional tone."""
-    welcome = """
-    Hello! Welcome to AidNexus, your AI-powered First Aid Assistant. I'm your voice assistant, and I'm here to help.
-    You can navigate the entire application using voice commands.
-    Simply say 'help' anytime to hear all available commands.
-    To navigate, say the page name, like 'First Aid Guide' or 'My Health Records'.
-    How can I assist you today?
-    """
-    return speak_text(welcome, rate=0.92, pitch=1.0, use_google_tts=use_premium and "GCP_TTS_API_KEY" in st.secrets if hasattr(st, 'secrets') else False)
+    return speak_text(_WELCOME_TEXT, rate=0.92, pitch=1.0, use_google_tts=use_premium and "GCP_TTS_API_KEY" in st.secrets if hasattr(st, 'secrets') else False)
 
 
-def speak_help_message() -> bool:
-    """Help message with available commands, spoken in a friendly, clear manner."""
-    commands = get_voice_navigation_commands()
-    help_text = "Here are all the voice commands you can use. "
+def _build_help_sentences() -> Tuple[str, ...]:
+    """Help text sentences listing the voice commands; the command table is static."""
+    commands = _COMMANDS
+    sentences = ["Here are all the voice commands you can use."]
     
     # Group commands by category for better understanding
     navigation_cmds = []
@@ -459,11 +716,22 @@ def speak_help_message() -> bool:
             action_cmds.append("'help' to hear this message again")
     
     if navigation_cmds:
-        help_text += "For navigation, " + ". ".join(navigation_cmds) + ". "
+        sentences.append(f"For navigation, {navigation_cmds[0]}.")
+        sentences += [f"{cmd}." for cmd in navigation_cmds[1:]]
     if action_cmds:
-        help_text += "Other commands: " + ". ".join(action_cmds) + ". "
-    
-    help_text += "Just speak naturally, and I'll understand. How can I help you?"
+        sentences.append(f"Other commands: {action_cmds[0]}.")
+        sentences += [f"{cmd}." for cmd in action_cmds[1:]]
     
-    return speak_text(help_text, rate=0.88, pitch=1.0, use_google_tts=False)
+    sentences += ["Just speak naturally, and I'll understand.", "How can I help you?"]
+    return tuple(sentences)
+
+
+# The command table is static, so the help message is built once at import
+_HELP_SENTENCES = _build_help_sentences()
+_HELP_TEXT = " ".join(_HELP_SENTENCES)
+
+
+def speak_help_message() -> bool:
+    """Help message with available commands, spoken in a friendly, clear manner."""
+    return speak_text(_HELP_TEXT, rate=0.88, pitch=1.0, use_google_tts=False, sentences=_HELP_SENTENCES)
 